@@ -1,6 +1,25 @@
 from django.contrib import admin
+from django.template.response import TemplateResponse
+from django.urls import path
 
+from .duplicates import clusters
 from .models import Post, Group, Comment, Follow
+from .search import fts_available, matching_ids
+
+
+class TextDuplicateFilter(admin.SimpleListFilter):
+    title = 'похожий текст'
+    parameter_name = 'text_duplicate'
+
+    def lookups(self, request, model_admin):
+        return (('yes', 'Дубликаты'), ('no', 'Оригиналы'))
+
+    def queryset(self, request, queryset):
+        if self.value() == 'yes':
+            return queryset.exclude(text_duplicate_of=None)
+        if self.value() == 'no':
+            return queryset.filter(text_duplicate_of=None)
+        return queryset
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -13,11 +32,45 @@ class PostAdmin(admin.ModelAdmin):
     )
     list_editable = ('group',)
     search_fields = ('text',)
-    list_filter = ('pub_date',)
+    list_filter = ('pub_date', TextDuplicateFilter)
+    empty_value_display = '-пусто-'
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip() or not fts_available():
+            return super().get_search_results(
+                request, queryset, search_term
+            )
+        return queryset.filter(pk__in=matching_ids(search_term)), False
+
+    def get_urls(self):
+        return [
+            path(
+                'duplicates/',
+                self.admin_site.admin_view(self.duplicates_view),
+                name='posts_post_duplicates',
+            ),
+        ] + super().get_urls()
+
+    def duplicates_view(self, request):
+        """Кластеры постов с почти одинаковыми картинками."""
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Похожие картинки',
+            'clusters': clusters(),
+        }
+        return TemplateResponse(
+            request, 'admin/posts/post/duplicates.html', context
+        )
+
+
+class CommentAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'text', 'created', 'author', 'post')
+    list_filter = ('created', TextDuplicateFilter)
     empty_value_display = '-пусто-'
 
 
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group)
-admin.site.register(Comment)
+admin.site.register(Comment, CommentAdmin)
 admin.site.register(Follow)
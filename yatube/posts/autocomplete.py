@@ -0,0 +1,164 @@
+import re
+import threading
+from bisect import bisect_left, insort
+from collections import Counter
+
+from django.urls import NoReverseMatch, reverse
+from django.utils.http import urlencode
+
+from posts.models import Group, Post, User
+
+HASHTAG_RE = re.compile(r'#(\w+)')
+RESULTS_LIMIT = 10
+USER, GROUP, TAG = 'user', 'group', 'tag'
+
+
+def hashtags(text):
+    return {tag.lower() for tag in HASHTAG_RE.findall(text or '')}
+
+
+class PrefixIndex:
+    """
+    Отсортированный массив (ключ, тип, значение): поиск по префиксу —
+    бинарный поиск начала диапазона и проход до первого несовпадения.
+    У записи есть счётчик ссылок: хештег из нескольких постов уходит
+    из подсказок вместе с последним из них.
+    """
+
+    def __init__(self, entries=()):
+        self.counts = Counter(entries)
+        self.entries = sorted(self.counts)
+        self.lock = threading.Lock()
+
+    def add(self, key, kind, value):
+        entry = (key.lower(), kind, value)
+        with self.lock:
+            self.counts[entry] += 1
+            if self.counts[entry] == 1:
+                insort(self.entries, entry)
+
+    def remove(self, key, kind, value):
+        entry = (key.lower(), kind, value)
+        with self.lock:
+            if entry not in self.counts:
+                return
+            self.counts[entry] -= 1
+            if self.counts[entry] > 0:
+                return
+            del self.counts[entry]
+            position = bisect_left(self.entries, entry)
+            if self.entries[position:position + 1] == [entry]:
+                del self.entries[position]
+
+    def search(self, prefix, limit=RESULTS_LIMIT):
+        prefix = prefix.lower()
+        entries = self.entries
+        position = bisect_left(entries, (prefix,))
+        found = {}
+        while position < len(entries) and len(found) < limit:
+            key, kind, value = entries[position]
+            if not key.startswith(prefix):
+                break
+            found.setdefault((kind, value), None)
+            position += 1
+        return list(found)
+
+
+_index = None
+_build_lock = threading.Lock()
+
+
+def _user_entries(username):
+    return [(username, USER, username)]
+
+
+def _group_entries(title, slug):
+    return [(title, GROUP, (slug, title)), (slug, GROUP, (slug, title))]
+
+
+def _tag_entries(text):
+    return [(tag, TAG, tag) for tag in hashtags(text)]
+
+
+def build_index():
+    entries = []
+    for username in User.objects.values_list('username', flat=True):
+        entries += _user_entries(username)
+    for title, slug in Group.objects.values_list('title', 'slug'):
+        entries += _group_entries(title, slug)
+    for text in Post.objects.filter(text__contains='#').values_list(
+        'text', flat=True
+    ).iterator():
+        entries += _tag_entries(text)
+    return PrefixIndex(
+        (key.lower(), kind, value) for key, kind, value in entries
+    )
+
+
+def get_index():
+    """Индекс строится при первом обращении процесса к подсказкам."""
+    global _index
+    if _index is None:
+        with _build_lock:
+            if _index is None:
+                _index = build_index()
+    return _index
+
+
+def _update(method, entries):
+    if _index is not None:
+        for entry in entries:
+            getattr(_index, method)(*entry)
+
+
+def replace_user(old, new):
+    """Меняет подсказку пользователя; None — пользователя нет."""
+    if old == new:
+        return
+    if old is not None:
+        _update('remove', _user_entries(old))
+    if new is not None:
+        _update('add', _user_entries(new))
+
+
+def replace_group(old, new):
+    """Меняет подсказки группы; old и new — (title, slug) или None."""
+    if old == new:
+        return
+    if old is not None:
+        _update('remove', _group_entries(*old))
+    if new is not None:
+        _update('add', _group_entries(*new))
+
+
+def replace_tags(old_text, new_text):
+    """Хештеги поста после правки: старые уходят, новые добавляются."""
+    old, new = hashtags(old_text), hashtags(new_text)
+    _update('remove', [(tag, TAG, tag) for tag in old - new])
+    _update('add', [(tag, TAG, tag) for tag in new - old])
+
+
+def _suggestion(kind, value):
+    if kind == USER:
+        label = value
+        url = reverse('posts:profile', kwargs={'username': value})
+    elif kind == GROUP:
+        slug, label = value
+        url = reverse('posts:group_list', kwargs={'slug': slug})
+    else:
+        label = f'#{value}'
+        url = reverse('posts:search') + '?' + urlencode({'q': label})
+    return {'type': kind, 'label': label, 'url': url}
+
+
+def suggest(prefix, limit=RESULTS_LIMIT):
+    prefix = prefix.strip().lstrip('#')
+    if not prefix:
+        return []
+    suggestions = []
+    for kind, value in get_index().search(prefix, limit):
+        try:
+            suggestions.append(_suggestion(kind, value))
+        except NoReverseMatch:
+            continue
+    return suggestions
@@ -0,0 +1,113 @@
+import time
+
+from django.core.cache import cache
+
+from posts.models import Follow, Post
+
+FEED_CACHE_TIMEOUT = 60 * 60 * 4
+CARD_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def _version_key(*feed):
+    return 'feed_version:' + ':'.join(str(part) for part in feed)
+
+
+def _new_version(old=None):
+    """Версия — время изменения в мс, строго больше предыдущей."""
+    now = int(time.time() * 1000)
+    return now if old is None else max(now, old + 1)
+
+
+def feed_versions(*feeds):
+    """Версии лент одним get_many; недостающие заводятся заново."""
+    keys = {feed: _version_key(*feed) for feed in feeds}
+    versions = cache.get_many(list(keys.values()))
+    missing = [key for key in keys.values() if key not in versions]
+    if missing:
+        for key in missing:
+            cache.add(key, _new_version(), None)
+        versions.update(cache.get_many(missing))
+    return {
+        feed: versions.get(key) or _new_version()
+        for feed, key in keys.items()
+    }
+
+
+def feed_version(*feed):
+    return feed_versions(feed)[feed]
+
+
+def bump(*feeds):
+    keys = [_version_key(*feed) for feed in feeds]
+    current = cache.get_many(keys)
+    cache.set_many(
+        {key: _new_version(current.get(key)) for key in keys}, None
+    )
+
+
+def touch_post(author_id, *group_ids):
+    """
+    Сбрасывает все ленты, в которых показывается пост. Ленты подписок
+    зависят от версий лент авторов (follow_feeds), поэтому подписчиков
+    перебирать не нужно.
+    """
+    bump(
+        ('index',),
+        ('author', author_id),
+        *(('group', group_id) for group_id in set(group_ids) if group_id)
+    )
+
+
+def touch_post_id(post_id):
+    post = Post.objects.filter(pk=post_id).values(
+        'author_id', 'group_id'
+    ).first()
+    if post is not None:
+        touch_post(post['author_id'], post['group_id'])
+
+
+def follow_feeds(user):
+    """
+    Ленты, от которых зависит лента подписок: подписки читателя
+    и ленты всех авторов, на которых он подписан.
+    """
+    return [
+        ('follow', user.pk),
+        *(
+            ('author', author_id)
+            for author_id in Follow.objects.filter(user=user).order_by(
+                'author_id'
+            ).values_list('author_id', flat=True)
+        ),
+    ]
+
+
+def fragment_key(request, *feeds):
+    """Ключ фрагмента ленты: версии лент, читатель и страница."""
+    viewer = None
+    if request.user.is_authenticated:
+        viewer = ('follow', request.user.pk)
+        if viewer in feeds:
+            viewer = None
+    versions = feed_versions(*feeds, *filter(None, [viewer]))
+    parts = [
+        f'{"-".join(str(part) for part in feed)}:{versions[feed]}'
+        for feed in feeds
+    ]
+    if viewer is not None:
+        parts.append(f'viewer-{viewer[1]}:{versions[viewer]}')
+    parts.append(
+        request.GET.get('cursor') or request.GET.get('page') or '1'
+    )
+    return '|'.join(parts)
+
+
+def card_key(post, *flags):
+    """Ключ карточки: пост, его версия и всё, что меняет разметку."""
+    return 'post_card:{}:{}:{}:{}:{}'.format(
+        post.pk,
+        int(post.updated.timestamp() * 1000000),
+        post.comments_count,
+        int(getattr(post, 'author_followed', False)),
+        ''.join(str(int(bool(flag))) for flag in flags),
+    )
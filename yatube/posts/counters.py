@@ -0,0 +1,109 @@
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from posts.feeds import celebrity_ids, fill_timelines, resume_threshold
+from posts.models import Comment, Follow, Post, User, UserStats
+
+BATCH_SIZE = 1000
+
+
+def _counts(queryset, field):
+    return dict(
+        queryset.order_by().values(field).annotate(
+            total=Count('pk')
+        ).values_list(field, 'total')
+    )
+
+
+def recount_user(user_id):
+    stats, created = UserStats.objects.update_or_create(
+        user_id=user_id,
+        defaults={
+            'posts_count': Post.objects.filter(author_id=user_id).count(),
+            'followers_count': Follow.objects.filter(
+                author_id=user_id
+            ).count(),
+            'following_count': Follow.objects.filter(
+                user_id=user_id
+            ).count(),
+        }
+    )
+    if created and stats.followers_count >= settings.FEED_FANOUT_THRESHOLD:
+        stats.celebrity = True
+        stats.save(update_fields=['celebrity'])
+    return stats
+
+
+def get_stats(user):
+    try:
+        return user.stats
+    except UserStats.DoesNotExist:
+        return recount_user(user.pk)
+
+
+def bump_user(user_id, **deltas):
+    """
+    Сдвигает счётчики пользователя. Отсутствующая запись при росте
+    счётчика пересчитывается целиком, при уменьшении пропускается:
+    она может удаляться вместе с пользователем.
+    """
+    updated = UserStats.objects.filter(user_id=user_id).update(**{
+        field: F(field) + delta for field, delta in deltas.items()
+    })
+    if not updated and min(deltas.values()) > 0:
+        recount_user(user_id)
+
+
+def bump_comments(post_id, delta):
+    Post.objects.filter(pk=post_id).update(
+        comments_count=F('comments_count') + delta
+    )
+
+
+def recount_stats():
+    posts = _counts(Post.objects.all(), 'author_id')
+    followers = _counts(Follow.objects.all(), 'author_id')
+    following = _counts(Follow.objects.all(), 'user_id')
+    celebrities = set(
+        UserStats.objects.filter(celebrity=True).values_list(
+            'user_id', flat=True
+        )
+    )
+
+    def is_celebrity(user_id):
+        count = followers.get(user_id, 0)
+        if user_id in celebrities:
+            return count >= resume_threshold()
+        return count >= settings.FEED_FANOUT_THRESHOLD
+
+    stats = (
+        UserStats(
+            user_id=user_id,
+            posts_count=posts.get(user_id, 0),
+            followers_count=followers.get(user_id, 0),
+            following_count=following.get(user_id, 0),
+            celebrity=is_celebrity(user_id),
+        )
+        for user_id in User.objects.values_list('pk', flat=True).iterator()
+    )
+    comments = Comment.objects.filter(
+        post_id=OuterRef('pk')
+    ).order_by().values('post_id').annotate(total=Count('pk')).values('total')
+    with transaction.atomic():
+        UserStats.objects.all().delete()
+        while True:
+            batch = list(islice(stats, BATCH_SIZE))
+            if not batch:
+                break
+            UserStats.objects.bulk_create(batch)
+        Post.objects.update(
+            comments_count=Coalesce(Subquery(comments), Value(0))
+        )
+        # Авторы, вернувшиеся к рассылке, дополняют ленты подписчиков.
+        for user_id in celebrities - celebrity_ids(celebrities):
+            fill_timelines(user_id)
+    return UserStats.objects.count()
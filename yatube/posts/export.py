@@ -0,0 +1,145 @@
+import json
+import zipfile
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.serializers.json import DjangoJSONEncoder
+
+from posts.models import Comment, Post
+
+EXPORT_CHUNK = 1000
+# Ответ отдаётся клиенту, как только в буфере накопилось столько байт.
+STREAM_BUFFER = 64 * 1024
+POST_FIELDS = ('pk', 'text', 'pub_date', 'group__slug', 'image')
+COMMENT_FIELDS = ('pk', 'post_id', 'text', 'created')
+
+
+def keyset(queryset, *fields, size=EXPORT_CHUNK):
+    """
+    Строки выборки порциями по size с продолжением после последнего pk:
+    в памяти одна порция, а каждый запрос идёт по индексу, без OFFSET.
+    """
+    last = 0
+    while True:
+        rows = list(
+            queryset.filter(pk__gt=last).order_by('pk').values(*fields)[:size]
+        )
+        if not rows:
+            return
+        yield from rows
+        last = rows[-1]['pk']
+
+
+def image_names(user, size=EXPORT_CHUNK):
+    """Имена картинок пользователя без повторов, порциями по имени."""
+    images = Post.objects.filter(author=user).exclude(image='')
+    last = ''
+    while True:
+        names = list(
+            images.filter(image__gt=last).order_by('image').values_list(
+                'image', flat=True
+            ).distinct()[:size]
+        )
+        if not names:
+            return
+        yield from names
+        last = names[-1]
+
+
+def _line(record):
+    return (
+        json.dumps(record, ensure_ascii=False, cls=DjangoJSONEncoder) + '\n'
+    ).encode()
+
+
+def records(user):
+    yield {
+        'type': 'user',
+        'id': user.pk,
+        'username': user.username,
+        'first_name': user.first_name,
+        'last_name': user.last_name,
+        'date_joined': user.date_joined,
+    }
+    for post in keyset(Post.objects.filter(author=user), *POST_FIELDS):
+        yield {
+            'type': 'post',
+            'id': post['pk'],
+            'text': post['text'],
+            'pub_date': post['pub_date'],
+            'group': post['group__slug'],
+            'image': post['image'] or None,
+        }
+    comments = Comment.objects.filter(author=user)
+    for comment in keyset(comments, *COMMENT_FIELDS):
+        yield {
+            'type': 'comment',
+            'id': comment['pk'],
+            'post': comment['post_id'],
+            'text': comment['text'],
+            'created': comment['created'],
+        }
+
+
+def jsonl_stream(user):
+    """
+    Данные пользователя в JSON Lines: объект на строку, строки
+    отдаются кусками по STREAM_BUFFER байт.
+    """
+    lines, size = [], 0
+    for record in records(user):
+        line = _line(record)
+        lines.append(line)
+        size += len(line)
+        if size >= STREAM_BUFFER:
+            yield b''.join(lines)
+            lines, size = [], 0
+    yield b''.join(lines)
+
+
+class _StreamBuffer:
+    """Файл только для записи: zipfile пишет в него, поток забирает."""
+
+    def __init__(self):
+        self.chunks = []
+        self.size = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self.chunks)
+        self.chunks, self.size = [], 0
+        return data
+
+
+def zip_stream(user, storage):
+    """
+    Zip-архив с data.jsonl и картинками в media/, собираемый на лету:
+    zipfile пишет в буфер без seek, а готовые байты сразу уходят
+    клиенту, так что архив не держится в памяти целиком.
+    """
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        with archive.open('data.jsonl', 'w', force_zip64=True) as target:
+            for record in records(user):
+                target.write(_line(record))
+                if buffer.size >= STREAM_BUFFER:
+                    yield buffer.pop()
+        for name in image_names(user):
+            try:
+                source = storage.open(name)
+            except (OSError, SuspiciousFileOperation):
+                continue
+            with source, archive.open(
+                f'media/{name}', 'w', force_zip64=True
+            ) as target:
+                for chunk in source.chunks():
+                    target.write(chunk)
+                    if buffer.size >= STREAM_BUFFER:
+                        yield buffer.pop()
+    yield buffer.pop()
@@ -0,0 +1,274 @@
+import heapq
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import islice
+from operator import attrgetter
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+
+from posts import cache
+from posts.models import Follow, Post, Timeline, UserStats
+from posts.utils import get_ordering, get_paginator, seek
+
+BATCH_SIZE = 1000
+CARD_FIELDS = (
+    'text',
+    'pub_date',
+    'updated',
+    'image',
+    'image_placeholder',
+    'comments_count',
+    'author',
+    'author__username',
+    'author__first_name',
+    'author__last_name',
+    'group',
+    'group__slug',
+    'group__title',
+)
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class MergedFeed:
+    """Ленты, отсортированные по (-pub_date, -pk), слитые в одну."""
+
+    ordering = ('-pub_date', '-pk')
+
+    def __init__(self, *sources, reverse=False):
+        self.sources = sources
+        self.reverse = reverse
+
+    def count(self):
+        return sum(source.count() for source in self.sources)
+
+    def seek(self, values, reverse=False):
+        return MergedFeed(
+            *(
+                seek(source, get_ordering(source), values, reverse)
+                for source in self.sources
+            ),
+            reverse=reverse
+        )
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        merged = heapq.merge(
+            *(source[:index.stop] for source in self.sources),
+            key=attrgetter('pub_date', 'pk'),
+            reverse=not self.reverse,
+        )
+        return list(islice(merged, index.start, index.stop))
+
+
+def _bulk_insert(entries, ignore_conflicts=False):
+    entries = iter(entries)
+    while True:
+        batch = list(islice(entries, BATCH_SIZE))
+        if not batch:
+            break
+        Timeline.objects.bulk_create(
+            batch, ignore_conflicts=ignore_conflicts
+        )
+
+
+def celebrity_ids(author_ids):
+    return set(
+        UserStats.objects.filter(
+            user_id__in=author_ids, celebrity=True
+        ).values_list('user_id', flat=True)
+    )
+
+
+def resume_threshold():
+    """Порог возврата к рассылке, не выше порога перехода."""
+    return min(
+        settings.FEED_FANOUT_RESUME, settings.FEED_FANOUT_THRESHOLD
+    )
+
+
+def update_celebrity(author_id):
+    """
+    Переводит автора между рассылкой постов и подмешиванием при чтении.
+    Порог возврата ниже порога перехода, чтобы автор на границе не
+    переключался с каждой подпиской. При возврате к рассылке ленты
+    подписчиков дополняются после коммита, не в запросе (queue_fill).
+    """
+    UserStats.objects.filter(
+        user_id=author_id,
+        celebrity=False,
+        followers_count__gte=settings.FEED_FANOUT_THRESHOLD,
+    ).update(celebrity=True)
+    if UserStats.objects.filter(
+        user_id=author_id,
+        celebrity=True,
+        followers_count__lt=resume_threshold(),
+    ).update(celebrity=False):
+        transaction.on_commit(partial(queue_fill, author_id))
+
+
+def _fill_in_worker(author_id):
+    try:
+        fill_timelines(author_id)
+        # Закешированные ленты подписок собраны по неполной ленте.
+        cache.bump(('author', author_id))
+    except Exception:
+        logger.exception('Ленты подписчиков %s не дополнены', author_id)
+    finally:
+        connection.close()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # Один поток: заполнения идут по очереди и не спорят
+            # за запись в Timeline.
+            _executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix='timelines'
+            )
+    return _executor
+
+
+def queue_fill(author_id):
+    """
+    Дополняет ленты подписчиков автора в фоновом потоке. Если процесс
+    завершится раньше, ленты восстановит rebuild_timelines.
+    """
+    if settings.FEED_FILL_IN_BACKGROUND:
+        _get_executor().submit(_fill_in_worker, author_id)
+    else:
+        fill_timelines(author_id)
+        cache.bump(('author', author_id))
+
+
+def fill_timelines(author_id):
+    entries = Post.objects.filter(
+        author_id=author_id, author__following__isnull=False
+    ).values_list('author__following__user_id', 'pk', 'pub_date')
+    _bulk_insert(
+        (
+            Timeline(user_id=user_id, post_id=post_id, pub_date=pub_date)
+            for user_id, post_id, pub_date in entries.iterator()
+        ),
+        ignore_conflicts=True,
+    )
+
+
+def is_celebrity(author_id):
+    return bool(celebrity_ids([author_id]))
+
+
+def fan_out(post):
+    if is_celebrity(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    _bulk_insert(
+        Timeline(user_id=user_id, post_id=post.pk, pub_date=post.pub_date)
+        for user_id in followers.iterator()
+    )
+
+
+def backfill(follow):
+    if is_celebrity(follow.author_id):
+        return
+    posts = Post.objects.filter(
+        author_id=follow.author_id
+    ).values_list('pk', 'pub_date')
+    _bulk_insert(
+        Timeline(user_id=follow.user_id, post_id=post_id, pub_date=pub_date)
+        for post_id, pub_date in posts.iterator()
+    )
+
+
+def prune(follow):
+    Timeline.objects.filter(
+        user_id=follow.user_id,
+        post__author_id=follow.author_id
+    ).delete()
+
+
+def rebuild_timelines():
+    entries = Post.objects.filter(
+        author__following__isnull=False
+    ).exclude(
+        author_id__in=celebrity_ids(
+            Follow.objects.values('author_id').distinct()
+        )
+    ).values_list('author__following__user_id', 'pk', 'pub_date')
+    with transaction.atomic():
+        Timeline.objects.all().delete()
+        _bulk_insert(
+            Timeline(user_id=user_id, post_id=post_id, pub_date=pub_date)
+            for user_id, post_id, pub_date in entries.iterator()
+        )
+    return Timeline.objects.count()
+
+
+def timeline_posts(user):
+    return Post.objects.filter(timeline__user=user).annotate(
+        feed_date=F('timeline__pub_date'),
+        feed_pk=F('timeline__post'),
+    ).order_by('-feed_date', '-feed_pk')
+
+
+def followed_celebrities(user):
+    return celebrity_ids(
+        Follow.objects.filter(user=user).values('author_id')
+    )
+
+
+def follow_feed(user, celebrities=None):
+    if celebrities is None:
+        celebrities = followed_celebrities(user)
+    if not celebrities:
+        return timeline_posts(user)
+    return MergedFeed(
+        timeline_posts(user).exclude(author_id__in=celebrities),
+        *(
+            Post.objects.filter(author_id=author_id).order_by(
+                '-pub_date', '-pk'
+            )
+            for author_id in sorted(celebrities)
+        )
+    )
+
+
+def load_feed(feed):
+    if isinstance(feed, MergedFeed):
+        return MergedFeed(
+            *(load_feed(source) for source in feed.sources),
+            reverse=feed.reverse
+        )
+    return feed.select_related('author', 'group').only(*CARD_FIELDS)
+
+
+def prepare_page(page_obj, user):
+    """Догружает для карточек страницы подписки читателя на авторов."""
+    posts = page_obj.object_list
+    followed = set()
+    if user.is_authenticated and posts:
+        followed = set(
+            Follow.objects.filter(
+                user=user,
+                author_id__in={post.author_id for post in posts}
+            ).values_list('author_id', flat=True)
+        )
+    for post in posts:
+        post.author_followed = post.author_id in followed
+    return page_obj
+
+
+def get_feed_page(feed, request, count=None):
+    page_obj = get_paginator(load_feed(feed), request, count=count)
+    return prepare_page(page_obj, request.user)
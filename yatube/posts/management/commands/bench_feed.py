@@ -0,0 +1,104 @@
+from statistics import median
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory
+
+from posts import counters, feeds
+from posts.models import Follow, Post, User, UserStats
+from posts.views import follow_index
+
+
+def _timed(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = perf_counter()
+        func()
+        timings.append((perf_counter() - start) * 1000)
+    return median(timings)
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает рассылку постов по лентам (push) и гибридную схему: '
+        'запись поста популярного автора и чтение /follow/ подписчиком '
+        'многих популярных авторов. Все данные откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--followers', type=int, default=100000)
+        parser.add_argument('--celebrities', type=int, default=50)
+        parser.add_argument('--posts', type=int, default=200)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.bench_write(options['followers'], options['repeat'])
+            self.bench_read(
+                options['celebrities'], options['posts'], options['repeat']
+            )
+            transaction.set_rollback(True)
+
+    def report(self, title, push, hybrid):
+        self.stdout.write(
+            f'{title}: push {push:.1f} мс, hybrid {hybrid:.1f} мс'
+        )
+
+    def bench_write(self, followers, repeat):
+        author = User.objects.create(username='bench-celebrity')
+        User.objects.bulk_create(
+            User(username=f'bench-follower-{i}') for i in range(followers)
+        )
+        Follow.objects.bulk_create(
+            Follow(user_id=user_id, author=author)
+            for user_id in User.objects.filter(
+                username__startswith='bench-follower-'
+            ).values_list('pk', flat=True).iterator()
+        )
+        counters.recount_user(author.pk)
+
+        def create_post():
+            Post.objects.create(author=author, text='bench')
+
+        stats = UserStats.objects.filter(user=author)
+        stats.update(celebrity=False)
+        push = _timed(create_post, repeat)
+        stats.update(celebrity=True)
+        hybrid = _timed(create_post, repeat)
+        self.report(
+            f'Пост автора с {followers} подписчиками', push, hybrid
+        )
+
+    def bench_read(self, celebrities, posts, repeat):
+        reader = User.objects.create(username='bench-reader')
+        User.objects.bulk_create(
+            User(username=f'bench-author-{i}') for i in range(celebrities)
+        )
+        authors = User.objects.filter(username__startswith='bench-author-')
+        Post.objects.bulk_create(
+            Post(author=author, text='bench')
+            for author in authors
+            for _ in range(posts)
+        )
+        Follow.objects.bulk_create(
+            Follow(user=reader, author=author) for author in authors
+        )
+        for author in authors:
+            counters.recount_user(author.pk)
+        request = RequestFactory().get('/follow/')
+        request.user = reader
+
+        def read_feed():
+            follow_index(request)
+
+        stats = UserStats.objects.filter(user__in=authors)
+        stats.update(celebrity=False)
+        feeds.rebuild_timelines()
+        push = _timed(read_feed, repeat)
+        stats.update(celebrity=True)
+        hybrid = _timed(read_feed, repeat)
+        self.report(
+            f'Чтение /follow/ подписчиком {celebrities} популярных авторов',
+            push, hybrid
+        )
@@ -0,0 +1,88 @@
+import random
+from itertools import islice
+from statistics import median
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import search
+from posts.models import Group, Post, User
+
+WORDS = (
+    'лето море город поезд книга музыка кофе дождь горы река '
+    'кошка собака рассвет закат работа отпуск друзья вечер утро снег'
+).split()
+BATCH_SIZE = 10000
+
+
+def _timed(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = perf_counter()
+        func()
+        timings.append((perf_counter() - start) * 1000)
+    return median(timings)
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает поиск по FTS5 с поиском через icontains на '
+        'сгенерированных постах. Все данные откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=1000000)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--query', default='море закат')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.fill(options['posts'])
+            self.bench(options['query'], options['repeat'])
+            transaction.set_rollback(True)
+
+    def fill(self, amount):
+        author = User.objects.create(username='bench-search-author')
+        group = Group.objects.create(
+            title='Бенчмарк поиска', slug='bench-search'
+        )
+        rng = random.Random(0)
+        posts = (
+            Post(
+                author=author,
+                group=group if i % 2 else None,
+                text=' '.join(rng.choices(WORDS, k=30)),
+            )
+            for i in range(amount)
+        )
+        while True:
+            batch = list(islice(posts, BATCH_SIZE))
+            if not batch:
+                break
+            Post.objects.bulk_create(batch)
+        start = perf_counter()
+        search.rebuild_index()
+        self.stdout.write(
+            f'Индекс {amount} постов построен за '
+            f'{perf_counter() - start:.1f} с'
+        )
+
+    def bench(self, query, repeat):
+        def fts():
+            results = search.SearchResults(query)
+            results.count()
+            results[:10]
+
+        def icontains():
+            posts = search.icontains_posts(query).select_related(
+                'author', 'group'
+            )
+            posts.count()
+            list(posts[:10])
+
+        self.stdout.write(
+            f'Поиск «{query}», первая страница с числом результатов: '
+            f'FTS5 {_timed(fts, repeat):.1f} мс, '
+            f'icontains {_timed(icontains, repeat):.1f} мс'
+        )
@@ -0,0 +1,63 @@
+import time
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import text_duplicates
+
+UPDATE_BATCH = 500
+
+
+class Command(BaseCommand):
+    help = (
+        'Находит кластеры почти одинаковых текстов постов и комментариев '
+        'по MinHash-подписям и связывает дубликаты с оригиналом.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model',
+            choices=[*text_duplicates.MODELS, 'all'],
+            default='all',
+            help='Какие тексты проверять.',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только посчитать кластеры, ничего не меняя.',
+        )
+
+    def handle(self, *args, **options):
+        labels = (
+            text_duplicates.MODELS if options['model'] == 'all'
+            else [options['model']]
+        )
+        for label in labels:
+            model = text_duplicates.MODELS[label]
+            started = time.monotonic()
+            # Тексты читаются порциями, в памяти остаются только подписи.
+            pks, found = text_duplicates.model_signatures(model)
+            roots = text_duplicates.clusters(pks, found)
+            elapsed = time.monotonic() - started
+            if not options['dry_run']:
+                self.save(model, roots)
+            self.stdout.write(
+                f'{label}: текстов с подписью {len(pks)}, '
+                f'кластеров {len(set(roots.values()))}, '
+                f'дубликатов {len(roots)}, {elapsed:.2f} с'
+            )
+
+    def save(self, model, roots):
+        members = defaultdict(list)
+        for pk, root in roots.items():
+            members[root].append(pk)
+        with transaction.atomic():
+            model.objects.exclude(text_duplicate_of=None).update(
+                text_duplicate_of=None
+            )
+            for root, pks in members.items():
+                for start in range(0, len(pks), UPDATE_BATCH):
+                    model.objects.filter(
+                        pk__in=pks[start:start + UPDATE_BATCH]
+                    ).update(text_duplicate_of=root)
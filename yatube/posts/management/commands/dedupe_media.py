@@ -0,0 +1,67 @@
+import posixpath
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from posts.models import Post
+from posts.page_cache import invalidate_posts
+from posts.thumbnails import release
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит картинки постов в хранилище с адресацией по '
+        'содержимому: одинаковые файлы сливаются в один, ссылки в '
+        'постах обновляются, старые файлы и их миниатюры удаляются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только посчитать, ничего не меняя.',
+        )
+
+    def handle(self, *args, **options):
+        field = Post._meta.get_field('image')
+        storage = field.storage
+        names = Post.objects.exclude(image='').order_by().values_list(
+            'image', flat=True
+        ).distinct()
+        moved = missing = freed = 0
+        targets = set()
+        for name in list(names):
+            if storage.is_hashed(name):
+                targets.add(name)
+                continue
+            if not storage.exists(name):
+                missing += 1
+                continue
+            # Новое имя строится от каталога upload_to, а не от каталога
+            # старого файла: так же, как у свежей загрузки.
+            source = posixpath.join(field.upload_to, posixpath.basename(name))
+            with storage.open(name) as content:
+                target = storage.hashed_name(source, content)
+                if target in targets or storage.exists(target):
+                    freed += storage.size(name)
+                elif not options['dry_run']:
+                    target = storage.save(source, content)
+            targets.add(target)
+            moved += 1
+            if options['dry_run']:
+                continue
+            with transaction.atomic():
+                posts = list(Post.objects.filter(image=name).values_list(
+                    'pk', 'author_id', 'group_id'
+                ))
+                Post.objects.filter(image=name).update(
+                    image=target, updated=timezone.now()
+                )
+            # В закешированных лентах и страницах ссылки на старый файл.
+            invalidate_posts(posts)
+            release(name)
+        self.stdout.write(self.style.SUCCESS(
+            f'Перенесено файлов: {moved}, уникальных: {len(targets)}, '
+            f'освобождено байт: {freed}, не найдено: {missing}'
+        ))
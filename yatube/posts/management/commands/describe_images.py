@@ -0,0 +1,45 @@
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from posts.models import Post
+from posts.page_cache import invalidate_posts
+from posts.uploads import describe_image
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет размеры и заглушки картинок постов, загруженных до '
+        'их появления. Повторный запуск обрабатывает только картинки '
+        'без заглушки.'
+    )
+
+    def handle(self, *args, **options):
+        storage = Post._meta.get_field('image').storage
+        names = Post.objects.exclude(image='').filter(
+            image_placeholder=''
+        ).order_by('image').values_list('image', flat=True).distinct()
+        described = failed = 0
+        for name in list(names):
+            try:
+                with storage.open(name) as file_:
+                    width, height, placeholder = describe_image(file_)
+            except (OSError, SuspiciousFileOperation):
+                placeholder = ''
+            if not placeholder:
+                failed += 1
+                continue
+            posts = Post.objects.filter(image=name)
+            changed = list(posts.values_list('pk', 'author_id', 'group_id'))
+            posts.update(
+                image_width=width,
+                image_height=height,
+                image_placeholder=placeholder,
+                updated=timezone.now(),
+            )
+            # Карточки в кеше собраны без заглушки.
+            invalidate_posts(changed)
+            described += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Описано картинок: {described}, не открылись: {failed}'
+        ))
@@ -0,0 +1,49 @@
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Min
+
+from posts.duplicates import image_hash
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Хеширует картинки постов, загруженных до появления хешей, и '
+        'связывает посты с одинаковым хешем; похожие, но не совпадающие '
+        'старые картинки не ищутся. Работающие процессы увидят новые '
+        'хеши после перезапуска.'
+    )
+
+    def handle(self, *args, **options):
+        storage = Post._meta.get_field('image').storage
+        names = Post.objects.exclude(image='').filter(
+            image_hash=None
+        ).order_by('image').values_list('image', flat=True).distinct()
+        hashed = failed = 0
+        for name in list(names):
+            try:
+                with storage.open(name) as file_:
+                    value = image_hash(file_)
+            except (OSError, SuspiciousFileOperation):
+                value = None
+            if value is None:
+                failed += 1
+                continue
+            Post.objects.filter(image=name).update(image_hash=value)
+            hashed += 1
+        groups = Post.objects.exclude(image_hash=None).filter(
+            image_duplicate_of=None
+        ).order_by().values('image_hash').annotate(
+            size=Count('pk'), original=Min('pk')
+        ).filter(size__gt=1)
+        linked = 0
+        for group in list(groups):
+            linked += Post.objects.filter(
+                image_hash=group['image_hash'], image_duplicate_of=None
+            ).exclude(pk=group['original']).update(
+                image_duplicate_of=group['original']
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Хешировано картинок: {hashed}, не открылись: {failed}, '
+            f'связано дубликатов: {linked}'
+        ))
@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+
+LEGACY_SIZE = ('960x339', thumbnails.CARD_OPTIONS)
+
+
+def _size(thumbnail):
+    if thumbnail is None or not thumbnail.exists():
+        return None
+    return thumbnail.storage.size(thumbnail.name)
+
+
+class Command(BaseCommand):
+    help = (
+        'Считает, сколько байт экономят адаптивные WebP-варианты по '
+        'сравнению с прежней JPEG-миниатюрой 960x339 для всех картинок.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--generate',
+            action='store_true',
+            help='Построить недостающие варианты перед подсчётом.',
+        )
+
+    def handle(self, *args, **options):
+        lookup = (
+            thumbnails.get_thumbnail if options['generate']
+            else thumbnails.ready_thumbnail
+        )
+        legacy_total = images = 0
+        totals = [0] * len(thumbnails.THUMBNAIL_SIZES)
+        names = Post.objects.exclude(image='').values_list(
+            'image', flat=True
+        ).distinct()
+        for name in names.iterator():
+            legacy = _size(lookup(name, LEGACY_SIZE[0], **LEGACY_SIZE[1]))
+            variants = [
+                _size(lookup(name, size, **size_options))
+                for size, size_options in thumbnails.THUMBNAIL_SIZES
+            ]
+            if legacy is None or None in variants:
+                continue
+            images += 1
+            legacy_total += legacy
+            totals = [
+                total + variant for total, variant in zip(totals, variants)
+            ]
+        self.stdout.write(f'Картинок с полным набором вариантов: {images}')
+        if not images:
+            return
+        self.stdout.write(f'JPEG 960x339 (было): {legacy_total} байт')
+        for (size, size_options), total in zip(
+            thumbnails.THUMBNAIL_SIZES, totals
+        ):
+            saved = legacy_total - total
+            self.stdout.write(
+                f'{size_options["format"]} {size}: {total} байт, '
+                f'экономия {saved} байт '
+                f'({saved / legacy_total:.0%})'
+            )
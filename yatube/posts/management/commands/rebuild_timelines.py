@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from posts.feeds import rebuild_timelines
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает ленты подписок из Follow и Post'
+
+    def handle(self, *args, **options):
+        count = rebuild_timelines()
+        self.stdout.write(self.style.SUCCESS(
+            f'Записей в лентах подписок: {count}'
+        ))
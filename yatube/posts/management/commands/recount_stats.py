@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import recount_stats
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает счётчики постов, подписчиков, подписок '
+        'и комментариев'
+    )
+
+    def handle(self, *args, **options):
+        count = recount_stats()
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитана статистика пользователей: {count}'
+        ))
@@ -0,0 +1,142 @@
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils import timezone
+
+from posts import thumbnails
+from posts.models import Post
+from posts.page_cache import invalidate_posts
+
+# Процессы работают с пониженным приоритетом, чтобы не отнимать
+# процессор у веб-воркеров на той же машине.
+WORKER_NICENESS = 10
+CHUNK_PER_WORKER = 8
+
+
+def _init_worker():
+    os.nice(WORKER_NICENESS)
+
+
+def _regenerate(name, force):
+    try:
+        return name, thumbnails.regenerate(name, force)
+    except Exception:
+        thumbnails.logger.exception('Не удалось построить миниатюры %s', name)
+        return name, False
+
+
+class Command(BaseCommand):
+    help = (
+        'Перестраивает все варианты миниатюр картинок постов в пуле '
+        'процессов. Прогресс сохраняется после каждой порции, и '
+        'прерванный запуск продолжается с того же места.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count(),
+            help='Число процессов; 0 — строить в текущем процессе.',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Удалить и построить заново уже готовые миниатюры.',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            default=os.path.join(
+                settings.BASE_DIR, 'regenerate_thumbnails.json'
+            ),
+            help='Файл с прогрессом для продолжения после прерывания.',
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Начать сначала, не читая сохранённый прогресс.',
+        )
+
+    def load_checkpoint(self, path, restart):
+        if restart or not os.path.exists(path):
+            return {'last': '', 'done': 0, 'failed': 0}
+        with open(path) as checkpoint:
+            return json.load(checkpoint)
+
+    def save_checkpoint(self, path, state):
+        temporary = path + '.tmp'
+        with open(temporary, 'w') as checkpoint:
+            json.dump(state, checkpoint)
+        os.replace(temporary, path)
+
+    def handle(self, *args, **options):
+        path = options['checkpoint']
+        state = self.load_checkpoint(path, options['restart'])
+        if state['last']:
+            self.stdout.write(
+                f'Продолжаю после {state["last"]}: '
+                f'уже обработано {state["done"]}'
+            )
+        names = Post.objects.exclude(image='').filter(
+            image__gt=state['last']
+        ).order_by('image').values_list('image', flat=True).distinct()
+        names = list(names)
+        workers = options['workers']
+        chunk_size = max(workers, 1) * CHUNK_PER_WORKER
+        started = time.monotonic()
+        processed = 0
+        executor = None
+        if workers:
+            # Процессы открывают свои соединения, а не наследуют
+            # соединение родителя через fork.
+            connections.close_all()
+            executor = ProcessPoolExecutor(workers, initializer=_init_worker)
+        try:
+            for start in range(0, len(names), chunk_size):
+                chunk = names[start:start + chunk_size]
+                if executor:
+                    results = list(executor.map(
+                        _regenerate, chunk, [options['force']] * len(chunk)
+                    ))
+                else:
+                    results = [
+                        _regenerate(name, options['force']) for name in chunk
+                    ]
+                ready = [name for name, ok in results if ok]
+                posts = Post.objects.filter(image__in=ready)
+                changed = list(
+                    posts.values_list('pk', 'author_id', 'group_id')
+                )
+                # Карточки с этими картинками перерисуются по новому updated,
+                # а в закешированных лентах и страницах прежние варианты.
+                posts.update(updated=timezone.now())
+                invalidate_posts(changed)
+                processed += len(chunk)
+                state['last'] = chunk[-1]
+                state['done'] += len(ready)
+                state['failed'] += len(chunk) - len(ready)
+                self.save_checkpoint(path, state)
+                self.report(processed, len(names), started)
+        finally:
+            if executor:
+                executor.shutdown()
+        if os.path.exists(path):
+            os.remove(path)
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: {state["done"]}, с ошибками: {state["failed"]}, '
+            f'{self.rate(processed, started)}'
+        ))
+
+    def rate(self, processed, started):
+        elapsed = time.monotonic() - started
+        return f'{processed / elapsed if elapsed else 0:.1f} картинок/с'
+
+    def report(self, processed, total, started):
+        self.stdout.write(
+            f'{processed}/{total}: {self.rate(processed, started)}'
+        )
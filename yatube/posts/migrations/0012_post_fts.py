@@ -0,0 +1,41 @@
+from django.db import migrations
+
+CREATE_SQL = (
+    'CREATE VIRTUAL TABLE IF NOT EXISTS posts_post_fts USING fts5('
+    'text, author, grp, tokenize="unicode61 remove_diacritics 2")'
+)
+FILL_SQL = '''
+    INSERT INTO posts_post_fts (rowid, text, author, grp)
+    SELECT post.id, post.text,
+           TRIM(
+               author.username || ' ' || author.first_name
+               || ' ' || author.last_name
+           ),
+           COALESCE(grp.title, '')
+    FROM posts_post AS post
+    JOIN auth_user AS author ON author.id = post.author_id
+    LEFT JOIN posts_group AS grp ON grp.id = post.group_id
+'''
+
+
+def create_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(CREATE_SQL)
+    schema_editor.execute(FILL_SQL)
+
+
+def drop_fts(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS posts_post_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_comment_post_created_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts, drop_fts),
+    ]
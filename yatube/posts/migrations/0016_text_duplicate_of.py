@@ -0,0 +1,24 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:35
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_post_image_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='text_duplicate_of',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='text_duplicates', to='posts.Comment', verbose_name='Дубликат текста комментария'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='text_duplicate_of',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='text_duplicates', to='posts.Post', verbose_name='Дубликат текста поста'),
+        ),
+    ]
@@ -0,0 +1,165 @@
+import hashlib
+import logging
+import urllib.request
+from functools import partial, wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import parse_http_date_safe
+
+from posts import cache as feeds_cache
+from posts.models import Group
+
+PAGE_CACHE_TIMEOUT = 60 * 60
+SURROGATE_HEADER = 'Surrogate-Key'
+PURGE_TIMEOUT = 2
+
+logger = logging.getLogger(__name__)
+
+
+def _hashed(prefix, value):
+    return prefix + hashlib.md5(value.encode()).hexdigest()
+
+
+def _page_key(request):
+    return _hashed('page:', request.get_full_path())
+
+
+def _index_key(key):
+    return _hashed('surrogate:', key)
+
+
+def post_key(post_id):
+    return f'post:{post_id}'
+
+
+def author_key(author_id):
+    return f'author:{author_id}'
+
+
+def group_key(slug):
+    return f'group:{slug}'
+
+
+def surrogate_keys(response, *keys):
+    """Помечает ответ ключами, по которым его потом можно сбросить."""
+    keys = dict.fromkeys(
+        (response.get(SURROGATE_HEADER) or '').split() + list(keys)
+    )
+    response[SURROGATE_HEADER] = ' '.join(keys)
+    return response
+
+
+def _remember(page_key, keys):
+    index_keys = [_index_key(key) for key in keys]
+    indexes = cache.get_many(index_keys)
+    cache.set_many(
+        {
+            index_key: indexes.get(index_key, set()) | {page_key}
+            for index_key in index_keys
+        },
+        PAGE_CACHE_TIMEOUT
+    )
+
+
+def purge_proxy(keys):
+    """
+    Просит прокси сбросить страницы с ключами: запрос PURGE на
+    PAGE_CACHE_PURGE_URL с заголовком Surrogate-Key (xkey в Varnish,
+    surrogate keys в Fastly и nginx).
+    """
+    request = urllib.request.Request(
+        settings.PAGE_CACHE_PURGE_URL,
+        method='PURGE',
+        headers={SURROGATE_HEADER: ' '.join(keys)},
+    )
+    try:
+        urllib.request.urlopen(request, timeout=PURGE_TIMEOUT).close()
+    except OSError:
+        logger.warning('Прокси не сбросил страницы %s', keys, exc_info=True)
+
+
+def purge(*keys):
+    """
+    Сбрасывает все закешированные страницы с любым из ключей — у себя
+    и, после коммита, в прокси, если он настроен.
+    """
+    index_keys = [_index_key(key) for key in keys]
+    pages = set()
+    for page_keys in cache.get_many(index_keys).values():
+        pages |= page_keys
+    cache.delete_many(list(pages) + index_keys)
+    if keys and settings.PAGE_CACHE_PURGE_URL:
+        transaction.on_commit(partial(purge_proxy, list(keys)))
+
+
+def purge_groups(*group_ids):
+    group_ids = {group_id for group_id in group_ids if group_id}
+    if group_ids:
+        purge(*(
+            group_key(slug) for slug in Group.objects.filter(
+                pk__in=group_ids
+            ).values_list('slug', flat=True)
+        ))
+
+
+def invalidate_posts(posts):
+    """
+    Сбрасывает ленты и страницы, в которых видны посты.
+    Посты передаются кортежами (pk, author_id, group_id).
+    """
+    for author_id, group_id in {(post[1], post[2]) for post in posts}:
+        feeds_cache.touch_post(author_id, group_id)
+    purge(
+        'index',
+        *(post_key(post[0]) for post in posts),
+        *{author_key(post[1]) for post in posts}
+    )
+    purge_groups(*{post[2] for post in posts})
+
+
+def anonymous_page(view):
+    """
+    Кеширует страницу целиком для анонимных GET-запросов.
+    Ключи страницы берутся из заголовка Surrogate-Key ответа и
+    отдаются дальше. Прокси разрешено хранить страницу (s-maxage),
+    только если настроен PAGE_CACHE_PURGE_URL и purge его сбрасывает.
+    Закешированный ответ сам отвечает 304 по своим ETag/Last-Modified.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method != 'GET' or request.user.is_authenticated:
+            response = view(request, *args, **kwargs)
+            if SURROGATE_HEADER in response:
+                del response[SURROGATE_HEADER]
+            patch_cache_control(response, private=True)
+            return response
+        page_key = _page_key(request)
+        response = cache.get(page_key)
+        if response is None:
+            response = view(request, *args, **kwargs)
+            keys = (response.get(SURROGATE_HEADER) or '').split()
+            if response.status_code != 200 or not keys:
+                return response
+            cache.set(page_key, response, PAGE_CACHE_TIMEOUT)
+            _remember(page_key, keys)
+        else:
+            last_modified = response.get('Last-Modified')
+            response = get_conditional_response(
+                request,
+                etag=response.get('ETag'),
+                last_modified=(
+                    last_modified and parse_http_date_safe(last_modified)
+                ),
+                response=response,
+            )
+        if settings.PAGE_CACHE_PURGE_URL:
+            patch_cache_control(
+                response, public=True, max_age=0, s_maxage=PAGE_CACHE_TIMEOUT
+            )
+        else:
+            patch_cache_control(response, public=True, max_age=0)
+        return response
+    return wrapper
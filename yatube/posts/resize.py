@@ -0,0 +1,246 @@
+import fcntl
+import hashlib
+import os
+import posixpath
+import tempfile
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.urls import reverse
+from django.utils.crypto import constant_time_compare, salted_hmac
+from PIL import Image, ImageOps
+
+from posts.models import Post
+from posts.uploads import SAVE_OPTIONS
+
+SIGNATURE_SALT = 'posts.resize'
+SIGNATURE_LENGTH = 32
+# Переполненный кеш ужимается до этой доли предела: каталог обходится
+# только при переполнении, а не при каждой записи.
+EVICT_TO = 0.9
+# Служебный каталог: счётчик размера кеша и блокировки — по одной на
+# первые два символа имени варианта, так что их число ограничено.
+STATE_DIR = '.state'
+SIZE_FILE = 'size'
+OPEN_ATTEMPTS = 3
+CONTENT_TYPES = {
+    'JPEG': 'image/jpeg',
+    'PNG': 'image/png',
+    'GIF': 'image/gif',
+    'WEBP': 'image/webp',
+}
+
+
+def _variant(path, width, height):
+    return f'{width}x{height}/{path}'
+
+
+def sign(path, width, height):
+    return salted_hmac(
+        SIGNATURE_SALT, _variant(path, width, height)
+    ).hexdigest()[:SIGNATURE_LENGTH]
+
+
+def is_valid(signature, path, width, height):
+    return constant_time_compare(signature, sign(path, width, height))
+
+
+def resize_url(path, width, height):
+    return reverse('posts:resize_image', kwargs={
+        'signature': sign(path, width, height),
+        'width': width,
+        'height': height,
+        'path': path,
+    })
+
+
+def is_allowed(path, width, height):
+    """Только картинки постов и размеры не больше IMAGE_MAX_SIDE."""
+    max_side = settings.IMAGE_MAX_SIDE
+    if not (0 < width <= max_side and 0 < height <= max_side):
+        return False
+    if posixpath.normpath(path) != path or path.startswith(('/', '..')):
+        return False
+    return Post.objects.filter(image=path).exists()
+
+
+def cache_path(path, width, height):
+    digest = hashlib.sha256(
+        _variant(path, width, height).encode()
+    ).hexdigest()
+    extension = os.path.splitext(path)[1].lower()
+    return os.path.join(
+        settings.RESIZE_CACHE_ROOT, digest[:2], digest + extension
+    )
+
+
+def content_type(path):
+    image_format = Image.registered_extensions().get(
+        os.path.splitext(path)[1].lower()
+    )
+    return CONTENT_TYPES.get(image_format, 'application/octet-stream')
+
+
+def resize(source, target, width, height):
+    """Вписывает картинку в width×height с обрезкой по центру."""
+    with Image.open(source) as image:
+        image_format = image.format
+        image.draft(image.mode, (width, height))
+        image = ImageOps.exif_transpose(image)
+        if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        image = ImageOps.fit(image, (width, height), Image.LANCZOS)
+        image.save(
+            target, image_format, **SAVE_OPTIONS.get(image_format, {})
+        )
+
+
+def _write(path, width, height, target):
+    storage = Post._meta.get_field('image').storage
+    directory = os.path.dirname(target)
+    descriptor, temporary = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, 'wb') as out:
+            with storage.open(path) as source:
+                resize(source, out, width, height)
+        os.replace(temporary, target)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+@contextmanager
+def _locked(name):
+    """Открытый файл name из служебного каталога под flock."""
+    directory = os.path.join(settings.RESIZE_CACHE_ROOT, STATE_DIR)
+    os.makedirs(directory, exist_ok=True)
+    descriptor = os.open(os.path.join(directory, name), os.O_RDWR | os.O_CREAT)
+    with os.fdopen(descriptor, 'r+') as file_:
+        fcntl.flock(file_, fcntl.LOCK_EX)
+        try:
+            yield file_
+        finally:
+            fcntl.flock(file_, fcntl.LOCK_UN)
+
+
+def _store_size(counter, total):
+    counter.seek(0)
+    counter.truncate()
+    counter.write(str(total))
+
+
+def _grow(target):
+    """
+    Прибавляет размер нового варианта к счётчику размера кеша и
+    вытесняет старые варианты, если кеш стал больше предела. Пустой
+    счётчик заполняется обходом каталога.
+    """
+    with _locked(SIZE_FILE) as counter:
+        value = counter.read()
+        if value:
+            total = int(value) + os.path.getsize(target)
+        else:
+            total = sum(item[1] for item in _cached_files())
+        if total > settings.RESIZE_CACHE_MAX_BYTES:
+            total = evict(keep=target)
+        _store_size(counter, total)
+
+
+def resized_file(path, width, height):
+    """
+    Путь к варианту картинки в дисковом кеше; строит его при промахе.
+    Одинаковые запросы ждут на файловой блокировке, так что картинку
+    уменьшает только один процесс, а остальные берут готовое.
+    Время изменения файла обновляется при каждом попадании — по нему
+    вытесняются давно не запрошенные варианты.
+    """
+    target = cache_path(path, width, height)
+    if not os.path.exists(target):
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shard = os.path.basename(os.path.dirname(target))
+        with _locked(f'{shard}.lock'):
+            if not os.path.exists(target):
+                _write(path, width, height, target)
+                _grow(target)
+                return target
+    try:
+        os.utime(target)
+    except FileNotFoundError:
+        # Вариант вытеснили между проверкой и обращением.
+        return resized_file(path, width, height)
+    return target
+
+
+def open_cached(path, width, height):
+    """
+    Открытый вариант из дискового кеша или None. Вариант попадает в
+    кеш только после проверки is_allowed, поэтому попадание по
+    подписанной ссылке обходится без запроса к базе.
+    """
+    target = cache_path(path, width, height)
+    try:
+        cached = open(target, 'rb')
+    except FileNotFoundError:
+        return None
+    try:
+        os.utime(target)
+    except FileNotFoundError:
+        pass
+    return cached
+
+
+def open_resized(path, width, height):
+    """
+    Открытый вариант картинки. Открытый файл переживает вытеснение,
+    а вариант, удалённый до открытия, строится заново.
+    """
+    for attempt in range(OPEN_ATTEMPTS):
+        target = resized_file(path, width, height)
+        try:
+            return open(target, 'rb')
+        except FileNotFoundError:
+            if attempt == OPEN_ATTEMPTS - 1:
+                raise
+
+
+def _cached_files():
+    for directory, directories, names in os.walk(
+        settings.RESIZE_CACHE_ROOT
+    ):
+        if directory == settings.RESIZE_CACHE_ROOT:
+            directories[:] = [
+                name for name in directories if name != STATE_DIR
+            ]
+        for name in names:
+            if name.endswith('.tmp'):
+                continue
+            file_path = os.path.join(directory, name)
+            try:
+                stat = os.stat(file_path)
+            except FileNotFoundError:
+                continue
+            yield stat.st_mtime, stat.st_size, file_path
+
+
+def evict(max_bytes=None, keep=None):
+    """
+    Удаляет самые давние варианты, пока кеш больше EVICT_TO предела.
+    Возвращает размер оставшегося кеша.
+    """
+    if max_bytes is None:
+        max_bytes = settings.RESIZE_CACHE_MAX_BYTES
+    files = sorted(_cached_files())
+    total = sum(size for _, size, _ in files)
+    if total <= max_bytes:
+        return total
+    for _, size, file_path in files:
+        if total <= max_bytes * EVICT_TO:
+            break
+        if file_path == keep:
+            continue
+        try:
+            os.remove(file_path)
+        except FileNotFoundError:
+            continue
+        total -= size
+    return total
@@ -0,0 +1,165 @@
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from posts.models import Post
+
+FTS_TABLE = 'posts_post_fts'
+SNIPPET_TOKENS = 32
+MARK_START, MARK_END = '\x02', '\x03'
+BATCH_SIZE = 1000
+
+INDEX_SQL = '''
+    SELECT post.id, post.text,
+           TRIM(
+               author.username || ' ' || author.first_name
+               || ' ' || author.last_name
+           ),
+           COALESCE(grp.title, '')
+    FROM posts_post AS post
+    JOIN auth_user AS author ON author.id = post.author_id
+    LEFT JOIN posts_group AS grp ON grp.id = post.group_id
+'''
+
+
+def fts_available():
+    return connection.vendor == 'sqlite'
+
+
+def create_index(cursor):
+    cursor.execute(
+        f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5('
+        'text, author, grp, tokenize="unicode61 remove_diacritics 2")'
+    )
+
+
+def index_posts(post_ids):
+    """Переиндексирует посты; удалённые пропадают из индекса."""
+    if not fts_available():
+        return
+    post_ids = list(post_ids)
+    with connection.cursor() as cursor:
+        for start in range(0, len(post_ids), BATCH_SIZE):
+            batch = post_ids[start:start + BATCH_SIZE]
+            marks = ', '.join(['%s'] * len(batch))
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({marks})', batch
+            )
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, text, author, grp) '
+                f'{INDEX_SQL} WHERE post.id IN ({marks})',
+                batch
+            )
+
+
+def unindex_post(post_id):
+    if fts_available():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post_id]
+            )
+
+
+def rebuild_index():
+    if not fts_available():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+        create_index(cursor)
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, text, author, grp) {INDEX_SQL}'
+        )
+        cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) "
+                       "VALUES ('optimize')")
+        cursor.execute(f'SELECT COUNT(*) FROM {FTS_TABLE}')
+        return cursor.fetchone()[0]
+
+
+def match_query(query):
+    """Запрос пользователя как AND префиксных терминов без синтаксиса FTS5."""
+    terms = [term.replace('"', '""') for term in query.split()]
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def highlight(text):
+    text = escape(text)
+    return mark_safe(
+        text.replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
+    )
+
+
+def matching_ids(query):
+    """Подзапрос id подходящих постов для фильтра pk__in."""
+    return RawSQL(
+        f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+        [match_query(query)]
+    )
+
+
+def icontains_posts(query):
+    condition = Q()
+    for term in query.split():
+        condition &= (
+            Q(text__icontains=term)
+            | Q(author__username__icontains=term)
+            | Q(group__title__icontains=term)
+        )
+    return Post.objects.filter(condition)
+
+
+class SearchResults:
+    """
+    Ранжированная выдача поиска для Paginator: count() и срезы идут
+    в FTS5, посты страницы догружаются одним запросом.
+    """
+
+    def __init__(self, query):
+        self.query = query
+        self.match = match_query(query)
+
+    def count(self):
+        if not self.match:
+            return 0
+        if not fts_available():
+            return icontains_posts(self.query).count()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT COUNT(*) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+                [self.match]
+            )
+            return cursor.fetchone()[0]
+
+    def _load(self, ids):
+        posts = Post.objects.select_related('author', 'group').in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop = index.start or 0, index.stop
+        if not self.match:
+            return []
+        if not fts_available():
+            return list(
+                icontains_posts(self.query).select_related(
+                    'author', 'group'
+                )[start:stop]
+            )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid, snippet({FTS_TABLE}, 0, %s, %s, %s, %s) '
+                f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+                'ORDER BY rank LIMIT %s OFFSET %s',
+                [
+                    MARK_START, MARK_END, '…', SNIPPET_TOKENS,
+                    self.match, stop - start, start,
+                ]
+            )
+            rows = cursor.fetchall()
+        posts = self._load([pk for pk, _ in rows])
+        snippets = dict(rows)
+        for post in posts:
+            post.highlight = highlight(snippets[post.pk])
+        return posts
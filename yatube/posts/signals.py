@@ -0,0 +1,293 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import (
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+
+from posts import (
+    autocomplete,
+    cache,
+    counters,
+    duplicates,
+    feeds,
+    page_cache,
+    search,
+    text_duplicates,
+    thumbnails,
+)
+from posts.uploads import describe_image
+from posts.models import Comment, Follow, Group, Post, User
+
+SEARCH_USER_FIELDS = ('username', 'first_name', 'last_name')
+
+
+def set_original(instance, name, pk):
+    """Ставит ссылку на оригинал, сбрасывая закешированный объект."""
+    field = instance._meta.get_field(name)
+    if field.is_cached(instance):
+        field.delete_cached_value(instance)
+    setattr(instance, field.attname, pk)
+
+
+def check_text(instance, saved_text, raw):
+    """Новый или изменённый текст сверяется с похожими текстами."""
+    instance._text_signature = None
+    instance._text_changed = not raw and instance.text != saved_text
+    if instance._text_changed:
+        instance._text_signature = text_duplicates.signature(instance.text)
+        set_original(instance, 'text_duplicate_of', (
+            text_duplicates.find_original(
+                type(instance), instance._text_signature, exclude=instance.pk
+            )
+        ))
+
+
+def index_text(instance):
+    if instance._text_changed:
+        text_duplicates.add(
+            type(instance), instance.pk, instance._text_signature
+        )
+
+
+@receiver(pre_save, sender=Post)
+def post_saving(sender, instance, raw=False, **kwargs):
+    saved = None
+    if instance.pk and not raw:
+        saved = Post.objects.filter(pk=instance.pk).values_list(
+            'group_id', 'image', 'text'
+        ).first()
+    (
+        instance._saved_group_id,
+        instance._saved_image,
+        instance._saved_text,
+    ) = saved or (None, None, None)
+    check_text(instance, instance._saved_text, raw)
+    instance._image_changed = (
+        not raw and instance.image.name != instance._saved_image
+    )
+    if not instance._image_changed:
+        return
+    if instance.image:
+        (
+            instance.image_width,
+            instance.image_height,
+            instance.image_placeholder,
+        ) = describe_image(instance.image)
+        instance.image_hash = duplicates.image_hash(instance.image)
+        if instance.image._committed:
+            instance.image.close()
+    else:
+        instance.image_width = instance.image_height = None
+        instance.image_placeholder = ''
+        instance.image_hash = None
+    set_original(instance, 'image_duplicate_of', duplicates.find_original(
+        instance.image_hash, exclude=instance.pk
+    ))
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        counters.bump_user(instance.author_id, posts_count=1)
+        feeds.fan_out(instance)
+    cache.touch_post(
+        instance.author_id, instance.group_id, instance._saved_group_id
+    )
+    search.index_posts([instance.pk])
+    if instance._image_changed:
+        duplicates.add(instance.pk, instance.image_hash)
+    index_text(instance)
+    if instance._saved_image not in ('', None, instance.image.name):
+        transaction.on_commit(
+            partial(thumbnails.release, instance._saved_image)
+        )
+    if instance._text_changed:
+        transaction.on_commit(partial(
+            autocomplete.replace_tags, instance._saved_text, instance.text
+        ))
+    page_cache.purge(page_cache.post_key(instance.pk))
+    if created or instance.group_id != instance._saved_group_id:
+        page_cache.purge('index', page_cache.author_key(instance.author_id))
+        page_cache.purge_groups(instance.group_id, instance._saved_group_id)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.bump_user(instance.author_id, posts_count=-1)
+    cache.touch_post(instance.author_id, instance.group_id)
+    search.unindex_post(instance.pk)
+    duplicates.remove(instance.pk)
+    text_duplicates.remove(Post, instance.pk)
+    transaction.on_commit(
+        partial(autocomplete.replace_tags, instance.text, None)
+    )
+    if instance.image:
+        transaction.on_commit(
+            partial(thumbnails.release, instance.image.name)
+        )
+    page_cache.purge(
+        'index',
+        page_cache.post_key(instance.pk),
+        page_cache.author_key(instance.author_id)
+    )
+    page_cache.purge_groups(instance.group_id)
+
+
+@receiver(pre_save, sender=Comment)
+def comment_saving(sender, instance, raw=False, **kwargs):
+    saved_text = None
+    if instance.pk and not raw:
+        saved_text = Comment.objects.filter(pk=instance.pk).values_list(
+            'text', flat=True
+        ).first()
+    check_text(instance, saved_text, raw)
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        index_text(instance)
+    if created and not raw:
+        counters.bump_comments(instance.post_id, 1)
+        cache.touch_post_id(instance.post_id)
+        page_cache.purge(page_cache.post_key(instance.post_id))
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    text_duplicates.remove(Comment, instance.pk)
+    counters.bump_comments(instance.post_id, -1)
+    cache.touch_post_id(instance.post_id)
+    page_cache.purge(page_cache.post_key(instance.post_id))
+
+
+def purge_follow(follow):
+    page_cache.purge(
+        page_cache.author_key(follow.author_id),
+        page_cache.author_key(follow.user_id)
+    )
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.bump_user(instance.author_id, followers_count=1)
+        counters.bump_user(instance.user_id, following_count=1)
+        feeds.update_celebrity(instance.author_id)
+        feeds.backfill(instance)
+        cache.bump(('follow', instance.user_id))
+        purge_follow(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.bump_user(instance.author_id, followers_count=-1)
+    counters.bump_user(instance.user_id, following_count=-1)
+    feeds.prune(instance)
+    feeds.update_celebrity(instance.author_id)
+    cache.bump(('follow', instance.user_id))
+    purge_follow(instance)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    page_cache.purge(page_cache.author_key(instance.pk))
+
+
+def search_names(user):
+    return tuple(getattr(user, field) for field in SEARCH_USER_FIELDS)
+
+
+@receiver(pre_save, sender=User)
+def user_saving(sender, instance, update_fields=None, raw=False, **kwargs):
+    instance._saved_names = search_names(instance)
+    if raw:
+        pass
+    elif instance.pk is None:
+        instance._saved_names = None
+    elif update_fields is None or set(SEARCH_USER_FIELDS) & set(
+        update_fields
+    ):
+        instance._saved_names = User.objects.filter(
+            pk=instance.pk
+        ).values_list(*SEARCH_USER_FIELDS).first()
+    instance._saved_username = (instance._saved_names or (None,))[0]
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, raw=False, **kwargs):
+    if not raw and instance._saved_username != instance.username:
+        # Подсказка появляется только после коммита: откаченная
+        # регистрация не оставляет ссылку на несуществующий профиль.
+        transaction.on_commit(partial(
+            autocomplete.replace_user,
+            instance._saved_username,
+            instance.username,
+        ))
+    if created or raw:
+        return
+    # Смена пароля или last_login не трогает индекс постов.
+    if instance._saved_names == search_names(instance):
+        return
+    search.index_posts(
+        instance.posts.values_list('pk', flat=True).iterator()
+    )
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    page_cache.purge(page_cache.group_key(instance.slug))
+
+
+@receiver(pre_delete, sender=Group)
+def group_deleting(sender, instance, **kwargs):
+    # SET_NULL обнуляет group у постов запросом, без post_save.
+    instance._post_ids = list(
+        instance.posts.values_list('pk', flat=True).iterator()
+    )
+
+
+@receiver(post_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    transaction.on_commit(partial(
+        autocomplete.replace_group, (instance.title, instance.slug), None
+    ))
+    search.index_posts(getattr(instance, '_post_ids', ()))
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    transaction.on_commit(
+        partial(autocomplete.replace_user, instance.username, None)
+    )
+
+
+@receiver(pre_save, sender=Group)
+def group_saving(sender, instance, raw=False, **kwargs):
+    instance._saved_group = None
+    if instance.pk and not raw:
+        instance._saved_group = Group.objects.filter(
+            pk=instance.pk
+        ).values_list('title', 'slug').first()
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, created, raw=False, **kwargs):
+    group = (instance.title, instance.slug)
+    if not raw and instance._saved_group != group:
+        transaction.on_commit(partial(
+            autocomplete.replace_group, instance._saved_group, group
+        ))
+    if not created and not raw:
+        search.index_posts(
+            instance.posts.values_list('pk', flat=True).iterator()
+        )
@@ -0,0 +1,51 @@
+import hashlib
+import os
+import re
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+HASHED_NAME = re.compile(
+    r'^(?P<prefix>[0-9a-f]{2})/(?P=prefix)[0-9a-f]{62}(\.[^./]*)?$'
+)
+
+
+def content_hash(content):
+    digest = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Хранит файл под именем sha256 его содержимого:
+    posts/<2 символа>/<хеш>.<расширение>. Одинаковые загрузки
+    получают одно имя и один файл (а значит, и одни миниатюры).
+    """
+
+    @staticmethod
+    def is_hashed(name):
+        """Имя уже в виде <каталог>/<2 символа>/<хеш>.<расширение>."""
+        directory, filename = os.path.split(name)
+        return bool(HASHED_NAME.match(
+            f'{os.path.basename(directory)}/{filename}'
+        ))
+
+    def hashed_name(self, name, content):
+        directory, filename = os.path.split(name)
+        if self.is_hashed(name):
+            directory = os.path.dirname(directory)
+        extension = os.path.splitext(filename)[1].lower()
+        digest = content_hash(content)
+        return os.path.join(directory, digest[:2], digest + extension)
+
+    def _save(self, name, content):
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            return name
+        return super()._save(name, content)
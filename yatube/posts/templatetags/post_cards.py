@@ -0,0 +1,37 @@
+from django import template
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from posts.cache import CARD_CACHE_TIMEOUT, card_key
+from posts.thumbnails import attach_pictures
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_cards(posts, show_group_link=False, show_user_link=False):
+    """
+    Карточки постов страницы: одна выборка из кеша на всю страницу,
+    а для отрисовки промахов — одна выборка миниатюр из kvstore.
+    """
+    posts = list(posts)
+    keys = [card_key(post, show_group_link, show_user_link) for post in posts]
+    cards = cache.get_many(keys)
+    attach_pictures(
+        post for key, post in zip(keys, posts) if key not in cards
+    )
+    missing = {}
+    for key, post in zip(keys, posts):
+        if key not in cards:
+            cards[key] = missing[key] = render_to_string(
+                'includes/form_posts.html',
+                {
+                    'post': post,
+                    'show_group_link': show_group_link,
+                    'show_user_link': show_user_link,
+                }
+            )
+    if missing:
+        cache.set_many(missing, CARD_CACHE_TIMEOUT)
+    return [mark_safe(cards[key]) for key in keys]
@@ -0,0 +1,38 @@
+from django import template
+from django.conf import settings
+
+from posts import resize, thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_picture(post):
+    """
+    srcset адаптивных вариантов картинки поста или None: тогда
+    генерация ставится в очередь, а шаблон показывает заглушку. Без
+    пула потоков варианты строятся сразу, как обычным {% thumbnail %}.
+    Картинка передаётся по имени: ключ sorl зависит от хранилища, и
+    так он совпадает с ключом миниатюр, построенных в пуле. Ленты
+    заранее проставляют post.picture всей странице одной выборкой.
+    """
+    if not post.image:
+        return None
+    name = post.image.name
+    if hasattr(post, 'picture'):
+        picture = post.picture
+    else:
+        picture = thumbnails.ready_picture(name)
+    if picture is None:
+        if not settings.THUMBNAIL_WORKERS:
+            return thumbnails.build_picture(name)
+        thumbnails.queue(post.pk, name)
+    return picture
+
+
+@register.simple_tag
+def resized(image, width, height):
+    """Подписанная ссылка на вариант картинки нужного размера."""
+    if not image:
+        return ''
+    return resize.resize_url(image.name, int(width), int(height))
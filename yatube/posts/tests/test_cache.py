@@ -0,0 +1,249 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts import cache as feed_cache
+from posts.models import Follow, Group, Post, User
+
+
+class FeedCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test-user')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Post.objects.bulk_create(
+            Post(author=cls.user, text=f'Старый пост {i}', group=cls.group)
+            for i in range(15)
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_cache_is_page_aware(self):
+        """Разные страницы ленты кешируются отдельно."""
+        url = reverse('posts:index')
+        first = self.guest_client.get(url).content
+        second = self.guest_client.get(url, {'page': 2}).content
+        self.assertNotEqual(first, second)
+        self.assertIn('Старый пост 0', second.decode())
+
+    def test_new_post_invalidates_feeds(self):
+        """Новый пост сразу виден в закешированных лентах."""
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user.username}),
+        ]
+        for url in urls:
+            self.guest_client.get(url)
+        Post.objects.create(author=self.user, text='Свежий', group=self.group)
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertContains(response, 'Свежий')
+
+    def test_group_change_invalidates_old_group(self):
+        """Перенос поста в другую группу сбрасывает кеш старой группы."""
+        post = Post.objects.create(
+            author=self.user, text='Переезжающий', group=self.group
+        )
+        url = reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        self.assertContains(self.guest_client.get(url), 'Переезжающий')
+        post.group = Group.objects.create(title='Другая', slug='other')
+        post.save()
+        self.assertNotContains(self.guest_client.get(url), 'Переезжающий')
+
+
+class FollowFeedCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='followed')
+        cls.reader = User.objects.create_user(username='follower')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def test_author_writes_do_not_touch_followers(self):
+        """Пост и комментарий видны в ленте подписок без обхода читателей."""
+        url = reverse('posts:follow_index')
+        self.client.get(url)
+        version = feed_cache.feed_version('follow', self.reader.pk)
+        post = Post.objects.create(author=self.author, text='Для подписчиков')
+        self.assertContains(self.client.get(url), 'Для подписчиков')
+        post.comments.create(author=self.author, text='Первый')
+        self.assertContains(self.client.get(url), 'Комментариев: 1')
+        self.assertEqual(
+            feed_cache.feed_version('follow', self.reader.pk), version
+        )
+
+
+class PostCardCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='card-user')
+        cls.post = Post.objects.create(author=cls.user, text='Карточка')
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_cards_are_reused_across_feeds(self):
+        """Отрисованная карточка берётся из кеша одним get_many."""
+        url = reverse('posts:index')
+        self.guest_client.get(url)
+        feed_cache.bump(('index',))
+        with mock.patch(
+            'posts.templatetags.post_cards.render_to_string'
+        ) as render:
+            response = self.guest_client.get(url)
+        render.assert_not_called()
+        self.assertContains(response, 'Карточка')
+
+    def test_edit_renders_new_card(self):
+        """Правка поста меняет версию и, значит, ключ карточки."""
+        url = reverse('posts:index')
+        self.assertContains(self.guest_client.get(url), 'Карточка')
+        Post.objects.filter(pk=self.post.pk).update(text='Исправлено')
+        post = Post.objects.get(pk=self.post.pk)
+        post.save()
+        self.assertContains(self.guest_client.get(url), 'Исправлено')
+
+
+class AnonymousPageCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='page-user')
+        cls.other = User.objects.create_user(username='page-reader')
+        cls.group = Group.objects.create(title='Группа', slug='page-slug')
+        cls.post = Post.objects.create(
+            author=cls.user, text='Закешированный', group=cls.group
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_page_served_from_cache(self):
+        """Повторный анонимный запрос не доходит до базы."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        response = self.guest_client.get(url)
+        self.assertIn(f'post:{self.post.pk}', response['Surrogate-Key'])
+        self.assertNotIn('s-maxage', response['Cache-Control'])
+        with self.assertNumQueries(0):
+            self.guest_client.get(url)
+
+    @override_settings(PAGE_CACHE_PURGE_URL='http://proxy.local/')
+    def test_writes_purge_proxy(self):
+        """С настроенным прокси страницы публичны и сбрасываются в нём."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        self.assertIn('s-maxage', self.guest_client.get(url)['Cache-Control'])
+        with mock.patch('urllib.request.urlopen') as urlopen, mock.patch(
+            'django.db.transaction.on_commit', lambda func: func()
+        ):
+            self.post.comments.create(author=self.other, text='Новый')
+        request = urlopen.call_args[0][0]
+        self.assertEqual(request.get_method(), 'PURGE')
+        self.assertEqual(request.full_url, 'http://proxy.local/')
+        self.assertEqual(
+            request.get_header('Surrogate-key'), f'post:{self.post.pk}'
+        )
+
+    def test_authorized_pages_are_private(self):
+        """Страницы для авторизованных не кешируются и не публичны."""
+        client = Client()
+        client.force_login(self.other)
+        response = client.get(reverse('posts:index'))
+        self.assertNotIn('Surrogate-Key', response)
+        self.assertIn('private', response['Cache-Control'])
+
+    def test_writes_purge_affected_pages(self):
+        """Запись сбрасывает ровно те страницы, которые она меняет."""
+        detail = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        group = reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        reader = reverse(
+            'posts:profile', kwargs={'username': self.other.username}
+        )
+        for url in (detail, group, reader):
+            self.guest_client.get(url)
+        Post.objects.create(author=self.other, text='Новый в группе')
+        with self.assertNumQueries(0):
+            self.guest_client.get(group)
+            self.guest_client.get(detail)
+        self.assertContains(self.guest_client.get(reader), 'Новый в группе')
+        Follow.objects.create(user=self.other, author=self.user)
+        with self.assertNumQueries(0):
+            self.guest_client.get(group)
+        self.post.comments.create(author=self.other, text='Комментарий')
+        self.assertContains(self.guest_client.get(detail), 'Комментарий')
+        self.assertContains(self.guest_client.get(group), 'Комментариев: 1')
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='etag-user')
+        cls.group = Group.objects.create(title='Группа', slug='etag-slug')
+        cls.post = Post.objects.create(
+            author=cls.user, text='Проверяемый', group=cls.group
+        )
+        cls.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': cls.group.slug}),
+            reverse('posts:profile', kwargs={'username': cls.user.username}),
+            reverse('posts:post_detail', kwargs={'post_id': cls.post.pk}),
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_not_modified(self):
+        """Неизменившаяся страница отвечает 304 без выборки ленты."""
+        # сессия и пользователь, плюс одна выборка объекта кроме главной
+        queries = (2, 3, 3, 3)
+        for url, count in zip(self.urls, queries):
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                with self.assertNumQueries(count):
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+
+    def test_change_invalidates_validators(self):
+        """Комментарий меняет ETag ленты и поста."""
+        etags = {url: self.client.get(url)['ETag'] for url in self.urls}
+        self.post.comments.create(author=self.user, text='Новый')
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(
+                    url, HTTP_IF_NONE_MATCH=etags[url]
+                )
+                self.assertEqual(response.status_code, 200)
+
+    def test_anonymous_cached_page_not_modified(self):
+        """Анонимная страница из кеша тоже отвечает 304."""
+        guest_client = Client()
+        url = self.urls[0]
+        response = guest_client.get(url)
+        with self.assertNumQueries(0):
+            response = guest_client.get(
+                url,
+                HTTP_IF_MODIFIED_SINCE=response['Last-Modified'],
+                HTTP_IF_NONE_MATCH=response['ETag'],
+            )
+        self.assertEqual(response.status_code, 304)
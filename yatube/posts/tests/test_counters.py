@@ -0,0 +1,58 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from posts.counters import get_stats
+from posts.models import Comment, Follow, Post, User, UserStats
+
+
+class CountersTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+
+    def stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_post_counters(self):
+        """Создание и удаление постов и комментариев меняет счётчики."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        comment = Comment.objects.create(
+            post=post, author=self.user, text='Комментарий'
+        )
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        comment.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        post.delete()
+        self.assertEqual(self.stats(self.author).posts_count, 0)
+
+    def test_follow_counters(self):
+        """Подписка и отписка меняют счётчики обоих пользователей."""
+        Follow.objects.create(user=self.user, author=self.author)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.user).following_count, 1)
+        Follow.objects.filter(user=self.user, author=self.author).delete()
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.user).following_count, 0)
+
+    def test_recount_stats(self):
+        """Команда recount_stats исправляет испорченные счётчики."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        for text in ('Второй', 'Третий'):
+            Post.objects.create(author=self.author, text=text)
+        Comment.objects.create(post=post, author=self.user, text='Да')
+        Follow.objects.create(user=self.user, author=self.author)
+        UserStats.objects.update(posts_count=100, followers_count=100)
+        Post.objects.update(comments_count=100)
+        call_command('recount_stats', stdout=StringIO())
+        stats = get_stats(User.objects.get(pk=self.author.pk))
+        self.assertEqual(stats.posts_count, 3)
+        self.assertEqual(stats.followers_count, 1)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
@@ -0,0 +1,122 @@
+import random
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image, ImageDraw
+
+from posts import duplicates
+from posts.models import Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def pattern_image(seed, size=(800, 600), quality=90, name='spam.jpg'):
+    """Картинка из случайных прямоугольников: у заливки хеш нулевой."""
+    generator = random.Random(seed)
+    image = Image.new('RGB', (800, 600), 'white')
+    draw = ImageDraw.Draw(image)
+    for _ in range(12):
+        x, y = generator.randrange(700), generator.randrange(500)
+        draw.rectangle(
+            (x, y, x + generator.randrange(50, 300),
+             y + generator.randrange(50, 300)),
+            fill=tuple(generator.randrange(256) for _ in range(3)),
+        )
+    buffer = BytesIO()
+    image.resize(size).save(buffer, 'JPEG', quality=quality)
+    return SimpleUploadedFile(
+        name, buffer.getvalue(), content_type='image/jpeg'
+    )
+
+
+class HashIndexTests(TestCase):
+    def test_search_by_hamming_distance(self):
+        """Поиск находит хеши в пределах порога, ближайшие первыми."""
+        index = duplicates.HashIndex([(1, 0b1011), (2, -1), (3, 0b1000)])
+        self.assertEqual(
+            index.search(0b1001, max_distance=2), [(1, 1), (3, 1)]
+        )
+        self.assertEqual(index.search(-1, max_distance=0), [(2, 0)])
+
+    def test_add_replace_and_remove(self):
+        """Новый хеш поста заменяет прежний, удалённые не находятся."""
+        index = duplicates.HashIndex([(1, 0)])
+        index.add(2, 0)
+        index.add(1, -1)
+        self.assertEqual(index.search(0, max_distance=0), [(2, 0)])
+        index.remove(2)
+        self.assertEqual(index.search(0, max_distance=0), [])
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class DuplicateImageTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='spammer')
+        cls.admin = User.objects.create_superuser(
+            'moderator', 'moderator@example.com', 'password'
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        duplicates._index = None
+
+    def test_reencoded_copies_are_flagged(self):
+        """Пережатые и уменьшенные копии ссылаются на оригинал."""
+        original = Post.objects.create(
+            author=self.user, text='Оригинал', image=pattern_image(1)
+        )
+        copy = Post.objects.create(
+            author=self.user, text='Копия',
+            image=pattern_image(1, size=(640, 480), quality=40),
+        )
+        copy_of_copy = Post.objects.create(
+            author=self.user, text='Ещё копия',
+            image=pattern_image(1, size=(400, 300), quality=60),
+        )
+        other = Post.objects.create(
+            author=self.user, text='Другая', image=pattern_image(2)
+        )
+        self.assertIsNotNone(original.image_hash)
+        self.assertIsNone(original.image_duplicate_of)
+        self.assertEqual(copy.image_duplicate_of, original)
+        self.assertEqual(copy_of_copy.image_duplicate_of, original)
+        self.assertIsNone(other.image_duplicate_of)
+
+        client = Client()
+        client.force_login(self.admin)
+        response = client.get(reverse('admin:posts_post_duplicates'))
+        self.assertEqual(response.status_code, 200)
+        [(cluster_original, cluster)] = response.context['clusters']
+        self.assertEqual(cluster_original, original)
+        self.assertEqual(cluster, [copy, copy_of_copy])
+
+    def test_hash_images_command(self):
+        """Команда хеширует старые картинки и связывает одинаковые."""
+        original = Post.objects.create(
+            author=self.user, text='Оригинал', image=pattern_image(1)
+        )
+        copy = Post.objects.create(
+            author=self.user, text='Копия', image=pattern_image(1)
+        )
+        value = original.image_hash
+        Post.objects.update(image_hash=None, image_duplicate_of=None)
+        out = StringIO()
+        call_command('hash_images', stdout=out)
+        original.refresh_from_db()
+        copy.refresh_from_db()
+        self.assertEqual(original.image_hash, value)
+        self.assertIsNone(original.image_duplicate_of)
+        self.assertEqual(copy.image_duplicate_of, original)
+        self.assertIn('связано дубликатов: 1', out.getvalue())
@@ -0,0 +1,86 @@
+import json
+import shutil
+import tempfile
+import zipfile
+from io import BytesIO
+
+from django.conf import settings
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts import export
+from posts.models import Comment, Post, User
+from posts.tests.test_thumbnails import make_image
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ExportTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='leaving')
+        cls.other = User.objects.create_user(username='staying')
+        cls.posts = [
+            Post.objects.create(author=cls.user, text=f'Пост {number}')
+            for number in range(5)
+        ]
+        cls.photo = Post.objects.create(
+            author=cls.user, text='С фото', image=make_image()
+        )
+        Post.objects.create(author=cls.other, text='Чужой пост')
+        Comment.objects.create(
+            post=cls.posts[0], author=cls.user, text='Свой комментарий'
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_keyset_reads_in_chunks(self):
+        """Выборка идёт порциями: в памяти не больше одной порции."""
+        queryset = Post.objects.filter(author=self.user)
+        with self.assertNumQueries(4):
+            rows = list(export.keyset(queryset, 'pk', size=2))
+        self.assertEqual(
+            [row['pk'] for row in rows],
+            sorted(post.pk for post in self.posts + [self.photo]),
+        )
+
+    def test_jsonl_export(self):
+        """JSONL отдаётся потоком и содержит только данные пользователя."""
+        response = self.client.get(reverse('posts:export_jsonl'))
+        self.assertTrue(response.streaming)
+        records = [
+            json.loads(line)
+            for line in b''.join(response.streaming_content).splitlines()
+        ]
+        self.assertEqual(records[0]['username'], 'leaving')
+        types = [record['type'] for record in records]
+        self.assertEqual(types.count('post'), 6)
+        self.assertEqual(types.count('comment'), 1)
+        self.assertNotIn(
+            'Чужой пост', [record.get('text') for record in records]
+        )
+
+    def test_zip_export_with_media(self):
+        """Zip-архив содержит data.jsonl и картинки постов."""
+        response = self.client.get(reverse('posts:export_zip'))
+        archive = zipfile.ZipFile(
+            BytesIO(b''.join(response.streaming_content))
+        )
+        self.assertIn('data.jsonl', archive.namelist())
+        image = archive.read(f'media/{self.photo.image.name}')
+        with self.photo.image.open() as original:
+            self.assertEqual(image, original.read())
+
+    def test_export_requires_login(self):
+        """Гость перенаправляется на страницу входа."""
+        response = Client().get(reverse('posts:export_jsonl'))
+        self.assertEqual(response.status_code, 302)
@@ -0,0 +1,245 @@
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.feeds import follow_feed
+from posts.models import Comment, Follow, Group, Post, Timeline, User
+from posts.utils import CursorPaginator
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.old_post = Post.objects.create(
+            author=cls.author,
+            text='Пост до подписки',
+        )
+
+    def timeline_ids(self):
+        return set(
+            Timeline.objects.filter(
+                user=self.user
+            ).values_list('post_id', flat=True)
+        )
+
+    def test_follow_backfills_timeline(self):
+        """Подписка добавляет в ленту старые посты автора."""
+        Follow.objects.create(user=self.user, author=self.author)
+        self.assertEqual(self.timeline_ids(), {self.old_post.pk})
+
+    def test_new_post_fans_out(self):
+        """Новый пост попадает в ленты подписчиков."""
+        Follow.objects.create(user=self.user, author=self.author)
+        new_post = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertIn(new_post.pk, self.timeline_ids())
+
+    def test_unfollow_and_delete_prune_timeline(self):
+        """Отписка и удаление поста чистят ленту."""
+        Follow.objects.create(user=self.user, author=self.author)
+        new_post = Post.objects.create(author=self.author, text='Новый пост')
+        new_post.delete()
+        self.assertEqual(self.timeline_ids(), {self.old_post.pk})
+        Follow.objects.filter(user=self.user, author=self.author).delete()
+        self.assertEqual(self.timeline_ids(), set())
+
+    def test_rebuild_timelines(self):
+        """Команда rebuild_timelines восстанавливает ленты."""
+        Follow.objects.create(user=self.user, author=self.author)
+        Timeline.objects.all().delete()
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertEqual(self.timeline_ids(), {self.old_post.pk})
+
+
+@override_settings(FEED_FANOUT_THRESHOLD=2)
+class HybridFeedTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.fan = User.objects.create_user(username='fan')
+        cls.author = User.objects.create_user(username='author')
+        cls.celebrity = User.objects.create_user(username='celebrity')
+        for user in (cls.user, cls.fan):
+            Follow.objects.create(user=user, author=cls.celebrity)
+        Follow.objects.create(user=cls.user, author=cls.author)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_celebrity_post_skips_fan_out(self):
+        """Посты популярного автора не рассылаются по лентам."""
+        post = Post.objects.create(author=self.celebrity, text='Пост')
+        self.assertFalse(Timeline.objects.filter(post=post).exists())
+
+    def test_follow_index_merges_celebrity_posts(self):
+        """Лента подписок сливает ленту и посты популярных авторов."""
+        posts = [
+            Post.objects.create(author=author, text=f'Пост {i}')
+            for i, author in enumerate(
+                [self.author, self.celebrity, self.author, self.celebrity]
+            )
+        ]
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        page_obj = response.context['page_obj']
+        self.assertEqual(page_obj.paginator.count, len(posts))
+        self.assertEqual(list(page_obj), posts[::-1])
+
+    def test_merged_feed_cursor_pages(self):
+        """Курсор проходит слитую ленту без пропусков и повторов."""
+        posts = [
+            Post.objects.create(author=author, text=f'Пост {i}')
+            for i, author in enumerate(
+                [self.author, self.celebrity, self.celebrity, self.author]
+            )
+        ]
+        page = CursorPaginator(follow_feed(self.user), 3).get_page()
+        seen = list(page)
+        page = CursorPaginator(follow_feed(self.user), 3).get_page(
+            cursor=page.next_cursor
+        )
+        seen.extend(page)
+        self.assertEqual(seen, posts[::-1])
+
+
+@override_settings(
+    FEED_FANOUT_THRESHOLD=3, FEED_FANOUT_RESUME=2,
+    FEED_FILL_IN_BACKGROUND=False,
+)
+class CelebrityThresholdTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author')
+        self.readers = [
+            User.objects.create_user(username=f'reader-{i}') for i in range(3)
+        ]
+        for reader in self.readers:
+            Follow.objects.create(user=reader, author=self.author)
+
+    def unfollow(self, reader):
+        Follow.objects.filter(user=reader, author=self.author).delete()
+
+    def test_posts_stay_in_feeds_after_dropping_below_threshold(self):
+        """Вернувшийся к рассылке автор дополняет ленты подписчиков."""
+        self.assertTrue(self.author.stats.celebrity)
+        post = Post.objects.create(author=self.author, text='Пост')
+        self.assertFalse(Timeline.objects.filter(post=post).exists())
+        late = User.objects.create_user(username='late')
+        Follow.objects.create(user=late, author=self.author)
+        self.unfollow(self.readers[0])
+        self.unfollow(self.readers[1])
+        self.author.stats.refresh_from_db()
+        self.assertTrue(self.author.stats.celebrity)
+        with mock.patch(
+            'django.db.transaction.on_commit', lambda func: func()
+        ):
+            self.unfollow(self.readers[2])
+        self.author.stats.refresh_from_db()
+        self.assertFalse(self.author.stats.celebrity)
+        self.assertEqual(
+            set(Timeline.objects.filter(post=post).values_list(
+                'user', flat=True
+            )),
+            {late.pk},
+        )
+        self.assertEqual(list(follow_feed(late)), [post])
+
+    def test_fill_waits_for_commit(self):
+        """Ленты дополняются после коммита, а не внутри отписки."""
+        Post.objects.create(author=self.author, text='Пост')
+        with mock.patch('posts.feeds.fill_timelines') as fill:
+            self.unfollow(self.readers[0])
+            self.unfollow(self.readers[1])
+        fill.assert_not_called()
+
+    def test_recount_keeps_celebrity_between_thresholds(self):
+        """Пересчёт не сбрасывает флаг автора между двумя порогами."""
+        self.unfollow(self.readers[0])
+        call_command('recount_stats', stdout=StringIO())
+        self.author.stats.refresh_from_db()
+        self.assertTrue(self.author.stats.celebrity)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class FeedLoaderTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def add_posts(self, amount):
+        for i in range(amount):
+            author = User.objects.create_user(
+                username=f'author-{User.objects.count()}'
+            )
+            Follow.objects.create(user=self.user, author=author)
+            post = Post.objects.create(
+                author=author,
+                text=f'Пост {i}',
+                group=self.group,
+                image=SimpleUploadedFile(
+                    f'small-{i}.gif', SMALL_GIF, content_type='image/gif'
+                ),
+            )
+            Comment.objects.create(post=post, author=self.user, text='Да')
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.authorized_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries.captured_queries)
+
+    def test_query_count_does_not_depend_on_page_size(self):
+        """Число запросов на страницу ленты не зависит от числа постов."""
+        urls = [
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:follow_index'),
+        ]
+        self.add_posts(2)
+        small_page = [self.count_queries(url) for url in urls]
+        self.add_posts(8)
+        full_page = [self.count_queries(url) for url in urls]
+        self.assertEqual(small_page, full_page)
+
+    def test_cards_get_comments_and_follow_state(self):
+        """Карточки получают число комментариев и состояние подписки."""
+        self.add_posts(1)
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        post = response.context['page_obj'][0]
+        self.assertEqual(post.comments_count, 1)
+        self.assertTrue(post.author_followed)
@@ -1,11 +1,16 @@
 import shutil
 import tempfile
+from io import BytesIO
 
+from django import forms
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import TestCase, Client, override_settings
 from django.urls import reverse
 from django.conf import settings
 
+from PIL import Image
+
+from posts.forms import PostForm
 from posts.models import Group, Post, User, Comment
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -70,11 +75,10 @@ class PostFormTests(TestCase):
             )
         )
         self.assertEqual(Post.objects.count(), posts_count + 1)
-        self.assertTrue(Post.objects.filter(
-            text=form_data['text'],
-            group=self.group.pk,
-            image=f'posts/{IMAGE_NAME}',
-        ).exists())
+        post = Post.objects.get(text=form_data['text'], group=self.group.pk)
+        self.assertRegex(
+            post.image.name, r'^posts/[0-9a-f]{2}/[0-9a-f]{64}\.gif$'
+        )
 
     def test_post_edit_form(self):
         """Тестирование изменения поста"""
@@ -197,3 +201,126 @@ class PostFormTests(TestCase):
             text=form_data['text'],
             post=form_data['post']
         ).exists())
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT, IMAGE_MAX_SIDE=100, IMAGE_MAX_PIXELS=10 ** 6
+)
+class ImageNormalizationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='uploader')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def make_jpeg(self, size):
+        image = Image.new('RGB', size, 'orange')
+        exif = image.getexif()
+        exif[0x010F] = 'Камера'
+        exif[0x0112] = 6
+        buffer = BytesIO()
+        image.save(buffer, 'JPEG', exif=exif)
+        return SimpleUploadedFile(
+            'photo.jpg', buffer.getvalue(), content_type='image/jpeg'
+        )
+
+    def test_image_downscaled_rotated_and_stripped(self):
+        """Картинка уменьшается, поворачивается по EXIF и теряет EXIF."""
+        form = PostForm(
+            data={'text': 'Фото'},
+            files={'image': self.make_jpeg((400, 200))},
+        )
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertIsInstance(form.fields['image'], forms.ImageField)
+        post = form.save(commit=False)
+        post.author = self.user
+        post.save()
+        with Image.open(post.image.path) as stored:
+            self.assertEqual(stored.size, (50, 100))
+            self.assertEqual(len(stored.getexif()), 0)
+
+    def save_post(self, upload):
+        form = PostForm(data={'text': 'Картинка'}, files={'image': upload})
+        self.assertTrue(form.is_valid(), form.errors)
+        post = form.save(commit=False)
+        post.author = self.user
+        post.save()
+        return post
+
+    def test_animation_downscaled_and_stripped(self):
+        """Анимация уменьшается покадрово и теряет комментарий."""
+        frames = [
+            Image.new('RGB', (400, 200), color)
+            for color in ('red', 'green', 'blue')
+        ]
+        buffer = BytesIO()
+        frames[0].save(
+            buffer, 'GIF', save_all=True, append_images=frames[1:],
+            duration=[50, 60, 70], loop=0, comment=b'secret',
+        )
+        post = self.save_post(SimpleUploadedFile(
+            'anim.gif', buffer.getvalue(), content_type='image/gif'
+        ))
+        with Image.open(post.image.path) as stored:
+            self.assertEqual((stored.size, stored.n_frames), ((100, 50), 3))
+            self.assertNotIn('comment', stored.info)
+            stored.seek(2)
+            self.assertEqual(stored.info['duration'], 70)
+
+    def test_mpo_saved_as_first_frame_jpeg(self):
+        """У многокадрового снимка телефона остаётся первый кадр в JPEG."""
+        Image.init()
+        if 'MPO' not in Image.SAVE:
+            self.skipTest('Pillow до 9.3 не собирает MPO для теста')
+        buffer = BytesIO()
+        Image.new('RGB', (400, 200), 'red').save(
+            buffer, 'MPO', save_all=True,
+            append_images=[Image.new('RGB', (400, 200), 'blue')],
+        )
+        post = self.save_post(SimpleUploadedFile(
+            'phone.jpg', buffer.getvalue(), content_type='image/jpeg'
+        ))
+        with Image.open(post.image.path) as stored:
+            self.assertEqual((stored.format, stored.size), ('JPEG', (100, 50)))
+            self.assertFalse(getattr(stored, 'is_animated', False))
+
+    def test_decompression_bomb_rejected(self):
+        """Картинка больше IMAGE_MAX_PIXELS отклоняется формой."""
+        form = PostForm(
+            data={'text': 'Бомба'},
+            files={'image': self.make_jpeg((2000, 1000))},
+        )
+        self.assertFalse(form.is_valid())
+        self.assertIn('image', form.errors)
+
+    def test_unwritable_format_saved_as_png(self):
+        """Формат, который Pillow не пишет, пересохраняется в PNG."""
+        xpm = (
+            b'/* XPM */\n'
+            b'static char *image[] = {\n'
+            b'"4 4 2 1",\n'
+            b'"  c #FFFFFF",\n'
+            b'". c #000000",\n'
+            b'".. .",\n'
+            b'" .. ",\n'
+            b'" .. ",\n'
+            b'".  ."\n'
+            b'};\n'
+        )
+        form = PostForm(
+            data={'text': 'Иконка'},
+            files={'image': SimpleUploadedFile(
+                'icon.xpm', xpm, content_type='image/x-xpixmap'
+            )},
+        )
+        self.assertTrue(form.is_valid(), form.errors)
+        post = form.save(commit=False)
+        post.author = self.user
+        post.save()
+        self.assertTrue(post.image.name.endswith('.png'))
+        with Image.open(post.image.path) as stored:
+            self.assertEqual((stored.format, stored.size), ('PNG', (4, 4)))
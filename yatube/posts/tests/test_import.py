@@ -0,0 +1,97 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from posts import cache as feeds_cache
+from posts.models import Comment, Follow, Group, Post, Timeline, User
+
+RECORDS = [
+    {'type': 'user', 'id': 'u1', 'username': 'migrant'},
+    {'type': 'user', 'id': 'u2', 'username': 'reader', 'first_name': 'Ира'},
+    {'type': 'user', 'id': 'u3', 'username': 'local'},
+    {'type': 'group', 'id': 'g1', 'slug': 'moved', 'title': 'Переезд'},
+    {
+        'type': 'post', 'id': 'p1', 'author': 'u1', 'group': 'g1',
+        'text': 'Первый пост на новом месте',
+        'pub_date': '2019-05-01T10:00:00Z',
+    },
+    {
+        'type': 'post', 'id': 'p2', 'author': 'u1', 'text': 'Второй',
+        'pub_date': '2019-05-02T10:00:00Z',
+    },
+    {
+        'type': 'comment', 'id': 'c1', 'post': 'p1', 'author': 'u2',
+        'text': 'С переездом!', 'created': '2019-05-01T11:00:00Z',
+    },
+    {'type': 'follow', 'user': 'u2', 'author': 'u1'},
+    {'type': 'follow', 'user': 'u2', 'author': 'u1'},
+    {'type': 'follow', 'user': 'u1', 'author': 'u1'},
+]
+
+
+class ImportJsonlTests(TestCase):
+    def setUp(self):
+        descriptor, self.path = tempfile.mkstemp(suffix='.jsonl')
+        os.close(descriptor)
+        self.addCleanup(os.remove, self.path)
+
+    def write(self, records):
+        with open(self.path, 'w', encoding='utf-8') as target:
+            for record in records:
+                target.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    def test_import_and_rebuild(self):
+        """Импорт сохраняет даты, связи и пересобирает производные данные."""
+        local = User.objects.create_user(username='local')
+        version = feeds_cache.feed_version('author', local.pk)
+        index_version = feeds_cache.feed_version('index')
+        cache.set('unrelated', 'value')
+        self.write(RECORDS)
+        call_command('import_jsonl', self.path, stdout=StringIO())
+        author = User.objects.get(username='migrant')
+        reader = User.objects.get(username='reader')
+        self.assertEqual(User.objects.filter(username='local').get(), local)
+        first = Post.objects.get(text='Первый пост на новом месте')
+        self.assertEqual(first.author, author)
+        self.assertEqual(first.group, Group.objects.get(slug='moved'))
+        self.assertEqual(
+            first.pub_date.isoformat(), '2019-05-01T10:00:00+00:00'
+        )
+        self.assertEqual(first.updated, first.pub_date)
+        self.assertEqual(first.comments_count, 1)
+        comment = Comment.objects.get()
+        self.assertEqual(comment.created.hour, 11)
+        self.assertEqual(
+            list(Follow.objects.values_list('user', 'author')),
+            [(reader.pk, author.pk)],
+        )
+        self.assertEqual(author.stats.posts_count, 2)
+        self.assertEqual(Timeline.objects.filter(user=reader).count(), 2)
+        response = self.client.get('/search/', {'q': 'переезд'})
+        self.assertEqual(response.context['page_obj'].paginator.count, 1)
+        # Кеш сброшен точечно: ленты автора, а не всё подряд.
+        self.assertNotEqual(feeds_cache.feed_version('index'), index_version)
+        self.assertEqual(
+            feeds_cache.feed_version('author', local.pk), version
+        )
+        self.assertEqual(cache.get('unrelated'), 'value')
+        # Сайт после импорта получает ключи за импортированными.
+        fresh = Post.objects.create(author=local, text='После импорта')
+        self.assertGreater(fresh.pk, first.pk)
+
+    def test_unknown_reference(self):
+        """Ошибка в любой строке останавливает импорт до записи в базу."""
+        self.write(RECORDS + [
+            {'type': 'post', 'id': 'p3', 'author': 'nobody', 'text': 'x'}
+        ])
+        line = f'Строка {len(RECORDS) + 1}'
+        with self.assertRaisesMessage(CommandError, line):
+            call_command('import_jsonl', self.path, stdout=StringIO())
+        self.assertFalse(User.objects.exists())
+        self.assertFalse(Post.objects.exists())
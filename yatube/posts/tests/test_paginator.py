@@ -0,0 +1,102 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from posts.models import Post, User
+from posts.utils import CursorPaginator
+
+PER_PAGE = 10
+
+
+class CursorPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test-user')
+        Post.objects.bulk_create(
+            Post(author=cls.user, text=f'Пост {i}') for i in range(25)
+        )
+        cls.posts = list(Post.objects.order_by('-pub_date', '-pk'))
+
+    def paginator(self):
+        return CursorPaginator(Post.objects.all(), PER_PAGE)
+
+    def test_next_cursor_walks_all_posts(self):
+        """Переход по next_cursor проходит все посты по порядку."""
+        page = self.paginator().get_page()
+        seen = list(page)
+        while page.next_cursor:
+            page = self.paginator().get_page(cursor=page.next_cursor)
+            seen.extend(page)
+        self.assertEqual(seen, self.posts)
+        self.assertEqual(page.number, 3)
+
+    def test_previous_and_last_cursor(self):
+        """previous_cursor и last_cursor возвращают нужные страницы."""
+        first = self.paginator().get_page()
+        second = self.paginator().get_page(cursor=first.next_cursor)
+        back = self.paginator().get_page(cursor=second.previous_cursor)
+        self.assertEqual(list(back), list(first))
+        self.assertEqual(back.number, 1)
+        last = self.paginator().get_page(cursor=first.last_cursor)
+        self.assertEqual(list(last), self.posts[20:])
+        self.assertEqual(last.number, 3)
+
+    def test_cursor_page_does_not_use_offset(self):
+        """Страница по курсору выбирается без OFFSET."""
+        first = self.paginator().get_page()
+        with CaptureQueriesContext(connection) as queries:
+            list(self.paginator().get_page(cursor=first.next_cursor))
+        self.assertFalse(
+            any('OFFSET' in query['sql'] for query in queries.captured_queries)
+        )
+
+    def test_bad_cursor_falls_back_to_first_page(self):
+        """Испорченный курсор открывает первую страницу."""
+        page = self.paginator().get_page(cursor='broken')
+        self.assertEqual(list(page), self.posts[:PER_PAGE])
+
+
+class EstimatedCountPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test-user')
+        Post.objects.bulk_create(
+            Post(author=cls.user, text=f'Пост {i}') for i in range(25)
+        )
+
+    def paginator(self, count):
+        return CursorPaginator(Post.objects.all(), PER_PAGE, count=count)
+
+    def test_no_count_query(self):
+        """С оценкой количества COUNT(*) не выполняется."""
+        with CaptureQueriesContext(connection) as queries:
+            page = self.paginator(1000).get_page(1)
+            self.assertTrue(page.has_next())
+            list(page.window)
+        self.assertEqual(len(queries.captured_queries), 1)
+        self.assertNotIn('COUNT', queries.captured_queries[0]['sql'])
+
+    def test_stale_count_is_corrected(self):
+        """Лишняя запись исправляет заниженную оценку."""
+        page = self.paginator(1).get_page(1)
+        self.assertTrue(page.has_next())
+        page = self.paginator(1).get_page(cursor=page.next_cursor)
+        page = self.paginator(1).get_page(cursor=page.next_cursor)
+        self.assertEqual(len(page), 5)
+        self.assertFalse(page.has_next())
+        self.assertEqual(page.paginator.count, 25)
+
+    def test_stale_count_keeps_page_number(self):
+        """Заниженная оценка не отбрасывает ?page=N на первую страницу."""
+        page = self.paginator(1).get_page(3)
+        self.assertEqual(page.number, 3)
+        self.assertEqual(len(page), 5)
+        page = self.paginator(1).get_page('abc')
+        self.assertEqual(page.number, 1)
+
+    def test_window_is_bounded(self):
+        """Ссылок на страницы не больше окна вокруг текущей."""
+        page = self.paginator(10 ** 6).get_page(2)
+        self.assertEqual(list(page.window), [1, 2, 3, 4])
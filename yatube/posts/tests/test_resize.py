@@ -0,0 +1,165 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from io import BytesIO
+from unittest import mock
+
+from django.conf import settings
+from django.test import Client, TestCase, override_settings
+from PIL import Image
+
+from posts import resize
+from posts.models import Post, User
+from posts.tests.test_thumbnails import make_image
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+TEMP_CACHE_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT, RESIZE_CACHE_ROOT=TEMP_CACHE_ROOT
+)
+class ResizeTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='resizer')
+        cls.post = Post.objects.create(
+            author=cls.user, text='Большая картинка', image=make_image()
+        )
+        cls.name = cls.post.image.name
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        shutil.rmtree(TEMP_CACHE_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        shutil.rmtree(TEMP_CACHE_ROOT, ignore_errors=True)
+        self.guest_client = Client()
+
+    def test_signed_url_returns_resized_image(self):
+        """По подписанной ссылке отдаётся картинка нужного размера."""
+        response = self.guest_client.get(
+            resize.resize_url(self.name, 300, 200)
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertIn('immutable', response['Cache-Control'])
+        image = Image.open(BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(image.size, (300, 200))
+
+    def test_tampered_url_is_rejected(self):
+        """Размер, не совпадающий с подписью, даёт 403."""
+        url = resize.resize_url(self.name, 300, 200).replace(
+            '300x200', '2000x2000'
+        )
+        self.assertEqual(self.guest_client.get(url).status_code, 403)
+
+    def test_only_post_images(self):
+        """Подписанные ссылки на чужие файлы и огромные размеры — 404."""
+        for path, width in (('posts/other.jpg', 300), (self.name, 5000)):
+            with self.subTest(path=path, width=width):
+                response = self.guest_client.get(
+                    resize.resize_url(path, width, 200)
+                )
+                self.assertEqual(response.status_code, 404)
+
+    def test_variant_is_cached_on_disk(self):
+        """Повторный запрос берёт вариант из кеша без пересжатия."""
+        url = resize.resize_url(self.name, 120, 120)
+        self.guest_client.get(url)
+        with mock.patch.object(resize, 'resize') as resize_mock:
+            response = self.guest_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        resize_mock.assert_not_called()
+
+    def test_concurrent_requests_resize_once(self):
+        """Одинаковые одновременные запросы уменьшают картинку один раз."""
+        original = resize.resize
+        calls = []
+
+        def slow_resize(*args):
+            calls.append(args)
+            time.sleep(0.1)
+            original(*args)
+
+        with mock.patch.object(resize, 'resize', slow_resize):
+            threads = [
+                threading.Thread(
+                    target=resize.resized_file, args=(self.name, 80, 60)
+                )
+                for _ in range(4)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(calls), 1)
+
+    def test_least_recently_used_are_evicted(self):
+        """При переполнении удаляются давно не запрошенные варианты."""
+        old = resize.resized_file(self.name, 100, 100)
+        recent = resize.resized_file(self.name, 110, 110)
+        os.utime(old, (0, 0))
+        limit = os.path.getsize(recent)
+        with override_settings(RESIZE_CACHE_MAX_BYTES=limit):
+            newest = resize.resized_file(self.name, 120, 120)
+        self.assertFalse(os.path.exists(old))
+        self.assertTrue(os.path.exists(newest))
+
+    def test_size_tracked_without_walking_cache(self):
+        """Запись варианта не обходит каталог, пока кеш меньше предела."""
+        resize.resized_file(self.name, 100, 100)
+        with mock.patch.object(resize, '_cached_files') as walk:
+            resize.resized_file(self.name, 110, 110)
+        walk.assert_not_called()
+        sizes = sum(
+            os.path.getsize(resize.cache_path(self.name, side, side))
+            for side in (100, 110)
+        )
+        with resize._locked(resize.SIZE_FILE) as counter:
+            self.assertEqual(int(counter.read()), sizes)
+
+    def test_locks_do_not_pile_up(self):
+        """Блокировки не лежат рядом с вариантами и не растут с их числом."""
+        for side in range(50, 60):
+            resize.resized_file(self.name, side, side)
+        names = [
+            name for _, _, names in os.walk(TEMP_CACHE_ROOT)
+            for name in names if name.endswith('.lock')
+        ]
+        self.assertLessEqual(len(names), 10)
+        self.assertEqual(
+            set(os.listdir(os.path.join(TEMP_CACHE_ROOT, resize.STATE_DIR))),
+            set(names) | {resize.SIZE_FILE},
+        )
+
+    def test_variant_evicted_before_open_is_rebuilt(self):
+        """Вариант, вытесненный до открытия, строится заново."""
+        original = resize.resized_file
+        calls = []
+
+        def evicted_once(*args):
+            target = original(*args)
+            calls.append(target)
+            if len(calls) == 1:
+                os.remove(target)
+            return target
+
+        with mock.patch.object(resize, 'resized_file', evicted_once):
+            with resize.open_resized(self.name, 90, 90) as resized:
+                self.assertEqual(Image.open(resized).size, (90, 90))
+        self.assertEqual(len(calls), 2)
+
+    def test_cache_hit_skips_database(self):
+        """Вариант из дискового кеша отдаётся без запросов к базе."""
+        url = resize.resize_url(self.name, 70, 70)
+        self.guest_client.get(url)
+        with self.assertNumQueries(0):
+            response = self.guest_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        response.close()
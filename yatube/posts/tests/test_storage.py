@@ -0,0 +1,90 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from posts import cache
+from posts.models import Post, User
+from posts.thumbnails import release
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ContentAddressedStorageTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reposter')
+        cls.storage = Post._meta.get_field('image').storage
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create_post(self, name):
+        post = Post(author=self.user, text='Мем')
+        post.image.save(name, ContentFile(SMALL_GIF))
+        return post
+
+    def test_same_content_shares_file(self):
+        """Одинаковые загрузки хранятся одним файлом."""
+        first = self.create_post('meme.gif')
+        second = self.create_post('meme-copy.gif')
+        self.assertEqual(first.image.name, second.image.name)
+
+    def test_file_deleted_with_last_reference(self):
+        """Файл удаляется только вместе с последним постом."""
+        first = self.create_post('meme.gif')
+        second = self.create_post('meme.gif')
+        name = first.image.name
+        first.delete()
+        release(name)
+        self.assertTrue(self.storage.exists(name))
+        second.delete()
+        release(name)
+        self.assertFalse(self.storage.exists(name))
+
+    def test_dedupe_command(self):
+        """Команда сливает старые файлы с одинаковым содержимым."""
+        legacy = []
+        for name in ('posts/a.gif', 'posts/old/b.gif'):
+            path = self.storage.path(name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as file:
+                file.write(SMALL_GIF)
+            legacy.append(Post.objects.create(
+                author=self.user, text='Старый', image=name
+            ))
+        version = cache.feed_version('index')
+        call_command('dedupe_media', stdout=StringIO())
+        self.assertGreater(cache.feed_version('index'), version)
+        names = {
+            post.image.name for post in Post.objects.filter(
+                pk__in=[post.pk for post in legacy]
+            )
+        }
+        self.assertEqual(len(names), 1)
+        name = names.pop()
+        self.assertTrue(self.storage.exists(name))
+        self.assertFalse(self.storage.exists('posts/a.gif'))
+        self.assertFalse(self.storage.exists('posts/old/b.gif'))
+        call_command('dedupe_media', stdout=StringIO())
+        self.assertEqual(
+            set(Post.objects.values_list('image', flat=True)), {name}
+        )
+        self.assertEqual(self.create_post('fresh.gif').image.name, name)
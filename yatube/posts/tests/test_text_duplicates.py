@@ -0,0 +1,103 @@
+from io import StringIO
+
+import numpy as np
+from django.core.management import call_command
+from django.test import TestCase
+
+from posts import text_duplicates
+from posts.models import Comment, Post, User
+
+SPAM = (
+    'Лучшие скидки недели! Заходите на наш сайт и получите бесплатную '
+    'доставку при первом заказе, только сегодня и только для вас.'
+)
+SPAM_EDITED = SPAM.replace('Лучшие', 'Самые лучшие') + '!!!'
+OTHER = (
+    'Сегодня гуляли по набережной, смотрели на закат и обсуждали, '
+    'куда поехать летом: на море или в горы.'
+)
+
+
+class TextDuplicateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='copypaster')
+
+    def setUp(self):
+        text_duplicates._indexes.clear()
+        text_duplicates.warm(background=False)
+        self.addCleanup(text_duplicates._indexes.clear)
+
+    def test_signature_estimates_similarity(self):
+        """Подпись похожих текстов совпадает почти целиком, разных — нет."""
+        spam = text_duplicates.signature(SPAM)
+        self.assertGreaterEqual(
+            (spam == text_duplicates.signature(SPAM_EDITED)).mean(),
+            text_duplicates.THRESHOLD,
+        )
+        self.assertLess(
+            (spam == text_duplicates.signature(OTHER)).mean(), 0.2
+        )
+        self.assertIsNone(text_duplicates.signature('Спасибо!'))
+
+    def test_posts_flagged_on_create_and_edit(self):
+        """Копии текста ссылаются на оригинал, в том числе после правки."""
+        original = Post.objects.create(author=self.user, text=SPAM)
+        copy = Post.objects.create(author=self.user, text=SPAM_EDITED)
+        other = Post.objects.create(author=self.user, text=OTHER)
+        self.assertIsNone(original.text_duplicate_of)
+        self.assertEqual(copy.text_duplicate_of, original)
+        self.assertIsNone(other.text_duplicate_of)
+        other.text = SPAM
+        other.save()
+        self.assertEqual(other.text_duplicate_of, original)
+        copy.text = OTHER
+        copy.save()
+        self.assertIsNone(copy.text_duplicate_of)
+
+    def test_comments_flagged(self):
+        """Комментарии сверяются с комментариями."""
+        post = Post.objects.create(author=self.user, text='Пост')
+        first = Comment.objects.create(post=post, author=self.user, text=SPAM)
+        second = Comment.objects.create(
+            post=post, author=self.user, text=SPAM_EDITED
+        )
+        self.assertEqual(second.text_duplicate_of, first)
+
+    def test_no_check_until_index_is_built(self):
+        """Без готового индекса сохранение не строит его и не проверяет."""
+        text_duplicates._indexes.clear()
+        Post.objects.create(author=self.user, text=SPAM)
+        copy = Post.objects.create(author=self.user, text=SPAM_EDITED)
+        self.assertIsNone(copy.text_duplicate_of)
+        self.assertEqual(text_duplicates._indexes, {})
+
+    def test_index_load_keeps_newer_changes(self):
+        """Загрузка из базы не затирает изменения, сделанные во время неё."""
+        index = text_duplicates.LSHIndex()
+        index.add(1, text_duplicates.signature(OTHER))
+        index.remove(2)
+        found, _ = text_duplicates.signatures([SPAM, SPAM])
+        index.load(np.array([1, 2]), found)
+        index.finish()
+        self.assertEqual(
+            index.search(text_duplicates.signature(SPAM)), []
+        )
+
+    def test_cluster_command(self):
+        """Команда находит кластеры в уже сохранённых текстах."""
+        posts = [
+            Post.objects.create(author=self.user, text=text)
+            for text in (SPAM, OTHER, SPAM_EDITED, SPAM + ' Звоните.')
+        ]
+        Post.objects.update(text_duplicate_of=None)
+        out = StringIO()
+        call_command('cluster_texts', model='post', stdout=out)
+        self.assertIn('кластеров 1, дубликатов 2', out.getvalue())
+        self.assertEqual(
+            list(Post.objects.filter(
+                text_duplicate_of=posts[0]
+            ).order_by('pk')),
+            [posts[2], posts[3]],
+        )
+        self.assertIsNone(Post.objects.get(pk=posts[1].pk).text_duplicate_of)
@@ -0,0 +1,209 @@
+import json
+import os
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from posts import cache as feeds_cache
+from posts import thumbnails
+from posts.models import Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def make_image(name='photo.jpg', size=(1200, 800), image_format='JPEG'):
+    buffer = BytesIO()
+    Image.new('RGB', size, 'teal').save(buffer, image_format)
+    return SimpleUploadedFile(
+        name, buffer.getvalue(), content_type='image/jpeg'
+    )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=2)
+class ThumbnailQueueTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='photographer')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(
+            author=self.user, text='С картинкой', image=make_image()
+        )
+        self.url = reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.pk}
+        )
+        self.guest_client = Client()
+
+    def test_placeholder_until_ready(self):
+        """Пока миниатюры нет, страница показывает заглушку и ставит задачу."""
+        with mock.patch.object(thumbnails, 'queue') as queue:
+            response = self.guest_client.get(self.url)
+        self.assertContains(response, 'data-thumbnail-pending')
+        queue.assert_called_once_with(self.post.pk, self.post.image.name)
+
+    def test_generated_thumbnail_is_served(self):
+        """После генерации страница отдаёт готовую миниатюру."""
+        with mock.patch.object(thumbnails, 'queue'):
+            self.guest_client.get(self.url)
+        thumbnails.generate(self.post.pk, self.post.image.name)
+        picture = thumbnails.ready_picture(self.post.image.name)
+        self.assertIsNotNone(picture)
+        response = self.guest_client.get(self.url)
+        self.assertContains(response, picture['webp_srcset'])
+        self.assertContains(response, picture['jpeg_srcset'])
+        self.assertNotContains(response, 'data-thumbnail-pending')
+
+    def test_one_task_per_image(self):
+        """Повторные запросы не ставят ту же картинку в очередь."""
+        with mock.patch.object(thumbnails, '_get_executor') as executor:
+            thumbnails.queue(self.post.pk, self.post.image.name)
+            thumbnails.queue(self.post.pk, self.post.image.name)
+        executor.return_value.submit.assert_called_once()
+
+    @override_settings(THUMBNAIL_WORKERS=0)
+    def test_without_pool_thumbnail_is_built_inline(self):
+        """Без пула миниатюра строится при отрисовке, без заглушки."""
+        response = self.guest_client.get(self.url)
+        self.assertNotContains(response, 'data-thumbnail-pending')
+
+    def test_variants_for_every_width(self):
+        """Для каждой ширины строятся WebP и запасной JPEG."""
+        thumbnails.build_picture(self.post.image.name)
+        sizes = [
+            thumbnails.ready_thumbnail(
+                self.post.image.name, size, **options
+            ).size
+            for size, options in thumbnails.THUMBNAIL_SIZES
+        ]
+        self.assertEqual(
+            [width for width, _ in sizes], [320, 640, 960, 320, 640, 960]
+        )
+        webp = thumbnails.ready_thumbnail(
+            self.post.image.name, '960x339', format='WEBP',
+            **thumbnails.CARD_OPTIONS
+        )
+        self.assertTrue(webp.name.endswith('.webp'))
+
+    def test_savings_report(self):
+        """Отчёт сравнивает варианты с прежней JPEG-миниатюрой."""
+        out = StringIO()
+        call_command('image_savings', generate=True, stdout=out)
+        report = out.getvalue()
+        self.assertIn('Картинок с полным набором вариантов: 1', report)
+        self.assertIn('WEBP 320x113', report)
+
+    def test_page_pictures_in_one_lookup(self):
+        """Миниатюры страницы достаются из kvstore одной выборкой."""
+        posts = [self.post] + [
+            Post.objects.create(
+                author=self.user, text=f'Пост {number}',
+                image=make_image(size=(200, 100 + number)),
+            )
+            for number in range(9)
+        ]
+        names = [post.image.name for post in posts]
+        for name in names:
+            thumbnails.build_picture(name)
+        # Как после перезапуска: кеш пуст, данные только в таблице sorl.
+        cache.clear()
+        with self.assertNumQueries(1):
+            pictures = thumbnails.ready_pictures(names)
+        self.assertNotIn(None, pictures.values())
+        with self.assertNumQueries(0):
+            self.assertEqual(thumbnails.ready_pictures(names), pictures)
+        with mock.patch.object(thumbnails, 'queue') as queue:
+            response = self.guest_client.get(reverse('posts:index'))
+        queue.assert_not_called()
+        for name in names:
+            self.assertContains(response, pictures[name]['webp_srcset'])
+
+    def test_regenerate_command(self):
+        """Команда строит все варианты и удаляет файл прогресса."""
+        checkpoint = f'{TEMP_MEDIA_ROOT}/progress.json'
+        out = StringIO()
+        call_command(
+            'regenerate_thumbnails', workers=0, checkpoint=checkpoint,
+            stdout=out,
+        )
+        self.assertIsNotNone(thumbnails.ready_picture(self.post.image.name))
+        self.assertIn('Готово: 1, с ошибками: 0', out.getvalue())
+        self.assertIn('картинок/с', out.getvalue())
+        self.assertFalse(os.path.exists(checkpoint))
+
+    def test_regenerate_command_keeps_cache(self):
+        """Команда сбрасывает только ленты с картинкой, а не весь кеш."""
+        version = feeds_cache.feed_version('index')
+        cache.set('unrelated', 'value')
+        call_command(
+            'regenerate_thumbnails', workers=0,
+            checkpoint=f'{TEMP_MEDIA_ROOT}/progress.json', stdout=StringIO(),
+        )
+        self.assertNotEqual(feeds_cache.feed_version('index'), version)
+        self.assertEqual(cache.get('unrelated'), 'value')
+
+    def test_regenerate_command_resumes(self):
+        """Прерванный запуск продолжается после последней картинки."""
+        other = Post.objects.create(
+            author=self.user, text='Вторая',
+            image=make_image(size=(300, 200)),
+        )
+        first, second = sorted([self.post.image.name, other.image.name])
+        checkpoint = f'{TEMP_MEDIA_ROOT}/progress.json'
+        with open(checkpoint, 'w') as progress:
+            json.dump({'last': first, 'done': 1, 'failed': 0}, progress)
+        with mock.patch.object(
+            thumbnails, 'regenerate', return_value=True
+        ) as regenerate:
+            call_command(
+                'regenerate_thumbnails', workers=0, checkpoint=checkpoint,
+                stdout=StringIO(),
+            )
+        regenerate.assert_called_once_with(second, False)
+
+    def test_placeholder_stored_on_upload(self):
+        """При загрузке сохраняются размеры картинки и крошечная заглушка."""
+        self.assertEqual(
+            (self.post.image_width, self.post.image_height), (1200, 800)
+        )
+        self.assertTrue(
+            self.post.image_placeholder.startswith('data:image/jpeg;base64,')
+        )
+        self.assertLess(len(self.post.image_placeholder), 1024)
+        with mock.patch.object(thumbnails, 'queue'):
+            response = self.guest_client.get(reverse('posts:index'))
+        self.assertContains(response, self.post.image_placeholder)
+        self.post.image = ''
+        self.post.save()
+        self.assertIsNone(self.post.image_width)
+        self.assertEqual(self.post.image_placeholder, '')
+
+    def test_describe_images_command(self):
+        """Команда заполняет заглушки картинок, загруженных без них."""
+        placeholder = self.post.image_placeholder
+        Post.objects.filter(pk=self.post.pk).update(
+            image_width=None, image_height=None, image_placeholder=''
+        )
+        out = StringIO()
+        call_command('describe_images', stdout=out)
+        self.post.refresh_from_db()
+        self.assertEqual(
+            (self.post.image_width, self.post.image_height), (1200, 800)
+        )
+        self.assertEqual(self.post.image_placeholder, placeholder)
+        self.assertIn('Описано картинок: 1', out.getvalue())
@@ -1,5 +1,6 @@
 import shutil
 import tempfile
+from unittest import mock
 
 from django.conf import settings
 from django.test import Client, TestCase, override_settings
@@ -8,6 +9,7 @@ from django import forms
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.cache import cache
 
+from posts import autocomplete
 from posts.models import Post, Group, User, Comment, Follow
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -176,10 +178,10 @@ class PostPagesTests(TestCase):
         response = self.authorized_client.get(
             self.reverse_urls_templates['detail']['url']
         )
-        first_object = response.context['author_post'][0]
+        first_object = response.context['post']
         first_object_comments = response.context['comments'][0]
         self.assertEqual(first_object.pk, self.post.pk)
-        self.assertEqual(response.context['author_post'].count(), 1)
+        self.assertEqual(response.context['author_posts_count'], 1)
         self.assertEqual(first_object.image, self.post.image)
         self.assertEqual(first_object_comments, self.comments)
 
@@ -320,3 +322,191 @@ class PostPagesTests(TestCase):
             new_post,
             response_client_is_not_signed.context['page_obj']
         )
+
+
+class CommentPaginationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='commentator')
+        cls.post = Post.objects.create(author=cls.user, text='Обсуждаемый')
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.user, text=f'Комментарий {i}')
+            for i in range(25)
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_first_batch_is_bounded(self):
+        """На странице поста только первая порция комментариев."""
+        response = self.guest_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        )
+        comments = response.context['comments']
+        self.assertEqual(len(comments), 20)
+        self.assertEqual(comments[0].text, 'Комментарий 0')
+        self.assertIsNotNone(response.context['next_cursor'])
+
+    def test_next_batch_endpoint(self):
+        """Следующая порция отдаётся отдельным запросом по курсору."""
+        url = reverse('posts:post_comments', kwargs={'post_id': self.post.pk})
+        first = self.guest_client.get(url)
+        with self.assertNumQueries(2):
+            second = self.guest_client.get(
+                url, {'cursor': first.context['next_cursor']}
+            )
+        texts = [comment.text for comment in second.context['comments']]
+        self.assertEqual(texts, [f'Комментарий {i}' for i in range(20, 25)])
+        self.assertIsNone(second.context['next_cursor'])
+        self.assertNotContains(second, 'Показать ещё')
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            username='searcher', first_name='Иван', last_name='Петров'
+        )
+        cls.group = Group.objects.create(title='Путешествия', slug='travel')
+        cls.post = Post.objects.create(
+            author=cls.user, text='Купались в море <b>до заката</b>'
+        )
+        Post.objects.create(
+            author=cls.user, text='Зимой в горах', group=cls.group
+        )
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.url = reverse('posts:search')
+
+    def results(self, query):
+        response = self.guest_client.get(self.url, {'q': query})
+        return [post.text for post in response.context['page_obj']]
+
+    def test_search_text_author_and_group(self):
+        """Поиск находит посты по тексту, имени автора и группе."""
+        self.assertEqual(
+            self.results('мор'), ['Купались в море <b>до заката</b>']
+        )
+        self.assertEqual(len(self.results('петров')), 2)
+        self.assertEqual(self.results('путешеств'), ['Зимой в горах'])
+
+    def test_index_follows_edits_and_deletes(self):
+        """Правка и удаление поста сразу видны в поиске."""
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Купались в реке'
+        post.save()
+        self.assertEqual(self.results('море'), [])
+        self.assertEqual(self.results('реке'), ['Купались в реке'])
+        post.delete()
+        self.assertEqual(self.results('реке'), [])
+
+    def test_group_delete_reindexes_posts(self):
+        """Посты удалённой группы больше не находятся по её названию."""
+        Group.objects.filter(pk=self.group.pk).delete()
+        self.assertEqual(self.results('путешеств'), [])
+        self.assertEqual(self.results('горах'), ['Зимой в горах'])
+
+    def test_user_reindexed_only_on_name_change(self):
+        """Посты переиндексируются при смене имени, но не пароля."""
+        user = User.objects.get(pk=self.user.pk)
+        with mock.patch('posts.signals.search.index_posts') as index_posts:
+            user.set_password('new-password')
+            user.save()
+            index_posts.assert_not_called()
+        user.last_name = 'Сидоров'
+        user.save()
+        self.assertEqual(len(self.results('сидоров')), 2)
+        self.assertEqual(self.results('петров'), [])
+
+    def test_highlight_is_escaped(self):
+        """Совпадение подсвечено, а HTML из текста экранирован."""
+        response = self.guest_client.get(self.url, {'q': 'заката'})
+        self.assertContains(response, '<mark>заката</mark>')
+        self.assertContains(response, '&lt;b&gt;')
+
+    def test_fts_syntax_is_not_interpreted(self):
+        """Операторы FTS5 в запросе не ломают поиск."""
+        self.assertEqual(self.results('"море" OR NEAR('), [])
+
+
+class AutocompleteTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='autocomplete-user')
+        Post.objects.create(author=cls.user, text='Пишу про #автодополнение')
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.url = reverse('posts:autocomplete')
+        autocomplete._index = None
+        self.addCleanup(setattr, autocomplete, '_index', None)
+        # TestCase не коммитит, а индекс обновляется после коммита.
+        committed = mock.patch(
+            'django.db.transaction.on_commit', lambda func: func()
+        )
+        committed.start()
+        self.addCleanup(committed.stop)
+
+    def labels(self, query):
+        response = self.guest_client.get(self.url, {'q': query})
+        return [item['label'] for item in response.json()['results']]
+
+    def test_prefix_matches_without_queries(self):
+        """Подсказки по префиксу отдаются без обращений к базе."""
+        self.labels('a')
+        with self.assertNumQueries(0):
+            self.assertIn('autocomplete-user', self.labels('AutoComp'))
+        self.assertIn('#автодополнение', self.labels('#автодоп'))
+
+    def test_new_user_and_group_are_added(self):
+        """Новые пользователь и группа сразу попадают в подсказки."""
+        self.labels('a')
+        User.objects.create_user(username='autocomplete-new')
+        Group.objects.create(title='Автогруппа', slug='autogroup')
+        self.assertIn('autocomplete-new', self.labels('autocomplete-n'))
+        self.assertEqual(
+            self.guest_client.get(self.url, {'q': 'автогр'}).json(),
+            {'results': [{
+                'type': 'group',
+                'label': 'Автогруппа',
+                'url': reverse(
+                    'posts:group_list', kwargs={'slug': 'autogroup'}
+                ),
+            }]}
+        )
+
+    def test_edits_renames_and_deletes_update_index(self):
+        """Правка, удаление и переименование убирают старые подсказки."""
+        self.labels('a')
+        first = Post.objects.create(author=self.user, text='#море и #горы')
+        second = Post.objects.create(author=self.user, text='Снова #море')
+        first.text = 'Только #горы'
+        first.save()
+        self.assertEqual(self.labels('#мор'), ['#море'])
+        second.delete()
+        self.assertEqual(self.labels('#мор'), [])
+        self.assertEqual(self.labels('#гор'), ['#горы'])
+        self.user.username = 'renamed-user'
+        self.user.save()
+        self.assertEqual(self.labels('autocomplete-u'), [])
+        self.assertEqual(self.labels('renamed'), ['renamed-user'])
+        group = Group.objects.create(title='Старое', slug='old-slug')
+        group.title = 'Новое'
+        group.save()
+        self.assertEqual(self.labels('стар'), [])
+        group.delete()
+        self.assertEqual(self.labels('нов'), [])
+
+    def test_index_updated_only_after_commit(self):
+        """До коммита новый пользователь в подсказки не попадает."""
+        self.labels('a')
+        with mock.patch('django.db.transaction.on_commit') as on_commit:
+            User.objects.create_user(username='autocomplete-draft')
+        self.assertEqual(self.labels('autocomplete-d'), [])
+        on_commit.call_args[0][0]()
+        self.assertEqual(self.labels('autocomplete-d'), ['autocomplete-draft'])
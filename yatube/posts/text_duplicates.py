@@ -0,0 +1,326 @@
+import logging
+import threading
+from collections import defaultdict
+from itertools import islice
+
+import numpy as np
+from django.db import connection
+
+from posts.models import Comment, Post
+
+logger = logging.getLogger(__name__)
+
+# Текст режется на пересекающиеся куски по SHINGLE символов; похожесть
+# двух текстов — доля общих кусков (мера Жаккара), которую MinHash
+# оценивает по NUM_PERM минимумам случайных хеш-функций.
+SHINGLE = 5
+NUM_PERM = 64
+# LSH: подпись делится на BANDS полос по ROWS значений, кандидаты —
+# тексты, совпавшие хотя бы в одной полосе целиком. Кандидаты с
+# оценкой похожести не ниже THRESHOLD считаются дубликатами.
+BANDS, ROWS = 16, 4
+THRESHOLD = 0.8
+# Короткие тексты («Спасибо!», «+1») совпадают у разных людей честно.
+MIN_LENGTH = 50
+PRIME = (1 << 31) - 1
+SHINGLE_BASE = 1_000_003
+# Сколько кусков обрабатывается за раз: матрица NUM_PERM × CHUNK
+# 64-битных значений (около 25 МБ).
+CHUNK = 50_000
+# Сколько текстов читается из базы за раз при построении индекса и
+# поиске кластеров: в памяти остаются только подписи.
+TEXTS_CHUNK = 5000
+
+# Хеш-функции вида (a·x + b) mod 2^64 >> 32 с нечётным a: без деления,
+# переполнение uint64 в NumPy и есть взятие по модулю 2^64.
+_random = np.random.RandomState(20221)
+PERM_A = (
+    _random.randint(0, 1 << 62, NUM_PERM, dtype=np.uint64) * 2 + 1
+)[:, None]
+PERM_B = _random.randint(0, 1 << 62, NUM_PERM, dtype=np.uint64)[:, None]
+SHIFT = np.uint64(32)
+
+
+def shingles(text):
+    """
+    Хеши кусков нормализованного текста или None для коротких:
+    полиномиальный хеш по кодам символов сразу для всех окон.
+    """
+    text = ' '.join((text or '').lower().split())
+    if len(text) < MIN_LENGTH:
+        return None
+    codes = np.frombuffer(text.encode('utf-32-le'), np.uint32).astype(
+        np.int64
+    )
+    windows = len(codes) - SHINGLE + 1
+    hashed = np.zeros(windows, np.int64)
+    for offset in range(SHINGLE):
+        hashed = (hashed * SHINGLE_BASE + codes[offset:offset + windows])
+        hashed %= PRIME
+    return np.unique(hashed)
+
+
+def _minhash(chunk):
+    values = np.concatenate(chunk).astype(np.uint64)
+    offsets = np.cumsum([0] + [len(item) for item in chunk[:-1]])
+    hashed = (PERM_A * values + PERM_B) >> SHIFT
+    return np.minimum.reduceat(hashed, offsets, axis=1).T.astype(np.uint32)
+
+
+def signatures(texts):
+    """
+    MinHash-подписи текстов: массив len(texts) × NUM_PERM и маска
+    текстов, для которых подпись есть. Все перестановки считаются
+    одной матричной операцией над кусками сразу многих текстов;
+    куски текстов живут, только пока считается их порция.
+    """
+    result = np.zeros((len(texts), NUM_PERM), np.uint32)
+    valid = np.zeros(len(texts), bool)
+    positions, chunk, size = [], [], 0
+    for position, text in enumerate(texts):
+        item = shingles(text)
+        if item is None:
+            continue
+        valid[position] = True
+        positions.append(position)
+        chunk.append(item)
+        size += len(item)
+        if size >= CHUNK:
+            result[positions] = _minhash(chunk)
+            positions, chunk, size = [], [], 0
+    if chunk:
+        result[positions] = _minhash(chunk)
+    return result, valid
+
+
+def stream_signatures(rows, size=TEXTS_CHUNK):
+    """
+    Подписи потока пар (pk, текст) порциями по size текстов: массив
+    pk и подписи тех текстов порции, для которых подпись есть.
+    """
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        found, valid = signatures([text for _, text in batch])
+        pks = np.array([pk for pk, _ in batch], np.int64)
+        yield pks[valid], found[valid]
+
+
+def model_signatures(model):
+    """Все pk и подписи текстов модели, прочитанные порциями."""
+    pks = [np.zeros(0, np.int64)]
+    found = [np.zeros((0, NUM_PERM), np.uint32)]
+    rows = model.objects.order_by('pk').values_list('pk', 'text')
+    for chunk_pks, chunk_found in stream_signatures(
+        rows.iterator(chunk_size=TEXTS_CHUNK)
+    ):
+        pks.append(chunk_pks)
+        found.append(chunk_found)
+    return np.concatenate(pks), np.concatenate(found)
+
+
+def signature(text):
+    found, valid = signatures([text])
+    return found[0] if valid[0] else None
+
+
+def bands(signature):
+    return [
+        (band, signature[band * ROWS:(band + 1) * ROWS].tobytes())
+        for band in range(BANDS)
+    ]
+
+
+class LSHIndex:
+    """
+    Подписи текстов и корзины LSH: поиск смотрит только кандидатов.
+    Пока индекс загружается из базы, изменения текстов применяются
+    сразу, а загрузка не перезаписывает уже изменённые pk.
+    """
+
+    def __init__(self):
+        self.buckets = defaultdict(set)
+        self.signatures = {}
+        self.touched = set()
+        self.ready = threading.Event()
+        self.lock = threading.Lock()
+
+    def _insert(self, pk, signature):
+        self._discard(pk)
+        self.signatures[pk] = signature
+        for key in bands(signature):
+            self.buckets[key].add(pk)
+
+    def add(self, pk, signature):
+        with self.lock:
+            if not self.ready.is_set():
+                self.touched.add(pk)
+            self._insert(pk, signature)
+
+    def remove(self, pk):
+        with self.lock:
+            if not self.ready.is_set():
+                self.touched.add(pk)
+            self._discard(pk)
+
+    def load(self, pks, found):
+        with self.lock:
+            for pk, signature in zip(pks.tolist(), found):
+                if pk not in self.touched:
+                    self._insert(pk, signature)
+
+    def finish(self):
+        with self.lock:
+            self.touched = set()
+            self.ready.set()
+
+    def _discard(self, pk):
+        signature = self.signatures.pop(pk, None)
+        if signature is None:
+            return
+        for key in bands(signature):
+            self.buckets[key].discard(pk)
+            if not self.buckets[key]:
+                del self.buckets[key]
+
+    def search(self, signature, threshold=THRESHOLD):
+        """Пары (pk, оценка похожести) по убыванию похожести."""
+        with self.lock:
+            candidates = set().union(*(
+                self.buckets.get(key, ()) for key in bands(signature)
+            ))
+            found = [
+                (pk, float(np.mean(self.signatures[pk] == signature)))
+                for pk in candidates
+            ]
+        return sorted(
+            [(pk, score) for pk, score in found if score >= threshold],
+            key=lambda item: (-item[1], item[0]),
+        )
+
+
+MODELS = {'post': Post, 'comment': Comment}
+_indexes = {}
+_build_lock = threading.Lock()
+
+
+def build_index(model, index):
+    rows = model.objects.order_by().values_list('pk', 'text')
+    for pks, found in stream_signatures(
+        rows.iterator(chunk_size=TEXTS_CHUNK)
+    ):
+        index.load(pks, found)
+    index.finish()
+
+
+def _build_in_background(model, index):
+    try:
+        build_index(model, index)
+    except Exception:
+        logger.exception('Индекс текстов %s не построен', model.__name__)
+    finally:
+        connection.close()
+
+
+def warm(background=True):
+    """
+    Строит индексы текстов при старте веб-процесса (yatube/wsgi.py),
+    по умолчанию в фоновом потоке. Пока индекс не готов, тексты
+    сохраняются без проверки; их находит команда cluster_texts.
+    """
+    for model in MODELS.values():
+        with _build_lock:
+            if model in _indexes:
+                continue
+            index = _indexes[model] = LSHIndex()
+        if background:
+            threading.Thread(
+                target=_build_in_background,
+                args=(model, index),
+                daemon=True,
+            ).start()
+        else:
+            build_index(model, index)
+
+
+def get_index(model):
+    """Готовый индекс модели или None: в запросе индекс не строится."""
+    index = _indexes.get(model)
+    if index is None or not index.ready.is_set():
+        return None
+    return index
+
+
+def add(model, pk, signature):
+    index = _indexes.get(model)
+    if index is None:
+        return
+    if signature is None:
+        index.remove(pk)
+    else:
+        index.add(pk, signature)
+
+
+def remove(model, pk):
+    if model in _indexes:
+        _indexes[model].remove(pk)
+
+
+def find_original(model, signature, exclude=None):
+    """
+    Самый ранний объект кластера с похожим текстом или None; как и у
+    картинок, дубликаты ссылаются прямо на оригинал кластера.
+    """
+    index = get_index(model)
+    if signature is None or index is None:
+        return None
+    matches = [pk for pk, _ in index.search(signature) if pk != exclude]
+    if not matches:
+        return None
+    roots = [
+        duplicate_of or pk
+        for pk, duplicate_of in model.objects.filter(
+            pk__in=matches
+        ).values_list('pk', 'text_duplicate_of')
+    ]
+    return min(roots) if roots else None
+
+
+def clusters(pks, found):
+    """
+    Кластеры похожих текстов по подписям: пары из общих корзин LSH с
+    оценкой не ниже THRESHOLD сливаются системой непересекающихся
+    множеств. Возвращает {pk: корень кластера} для всех кроме корней.
+    """
+    pks = list(pks.tolist() if isinstance(pks, np.ndarray) else pks)
+    parent = {}
+
+    def root(pk):
+        path = []
+        while parent.get(pk, pk) != pk:
+            path.append(pk)
+            pk = parent[pk]
+        for item in path:
+            parent[item] = pk
+        return pk
+
+    buckets = defaultdict(list)
+    for position in range(len(pks)):
+        for key in bands(found[position]):
+            buckets[key].append(position)
+    for positions in buckets.values():
+        # Первый текст корзины сравнивается со всеми остальными разом;
+        # непохожие на него проверяются следующим кругом.
+        remaining = np.array(positions, np.int64)
+        while len(remaining) > 1:
+            first, rest = remaining[0], remaining[1:]
+            similar = np.mean(found[rest] == found[first], axis=1)
+            similar = similar >= THRESHOLD
+            for position in rest[similar]:
+                left, right = root(pks[first]), root(pks[position])
+                if left != right:
+                    parent[max(left, right)] = min(left, right)
+            remaining = rest[~similar]
+    return {pk: root(pk) for pk in parent if root(pk) != pk}
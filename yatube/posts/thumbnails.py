@@ -0,0 +1,249 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import connection, transaction
+from django.utils import timezone
+from sorl.thumbnail import default, delete
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import (
+    EMPTY_VALUE, KVStore as CachedDBKVStore,
+)
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from posts import cache as feed_cache
+from posts import page_cache
+from posts.models import Post
+
+logger = logging.getLogger(__name__)
+
+# Ширины адаптивных вариантов картинки карточки и их форматы: WebP
+# для браузеров, которые его понимают, и JPEG как запасной.
+WIDTHS = (320, 640, 960)
+ASPECT_RATIO = 339 / 960
+FORMATS = ('WEBP', 'JPEG')
+CARD_OPTIONS = {'crop': 'center', 'upscale': True}
+
+
+def geometry(width):
+    return f'{width}x{round(width * ASPECT_RATIO)}'
+
+
+# Все размеры, которые используют шаблоны: (геометрия, опции sorl).
+THUMBNAIL_SIZES = tuple(
+    (geometry(width), dict(CARD_OPTIONS, format=image_format))
+    for image_format in FORMATS
+    for width in WIDTHS
+)
+LOCK_TIMEOUT = 60
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def thumbnail_file(file_, geometry, **options):
+    """Файл миниатюры, который построил бы sorl, без его генерации."""
+    backend = default.backend
+    source = ImageFile(file_)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    name = backend._get_thumbnail_filename(source, geometry, options)
+    return ImageFile(name, default.storage)
+
+
+def ready_thumbnail(file_, geometry, **options):
+    """Готовая миниатюра из kvstore или None, если её ещё нет."""
+    return default.kvstore.get(thumbnail_file(file_, geometry, **options))
+
+
+def get_thumbnail(file_, geometry, **options):
+    return default.backend.get_thumbnail(file_, geometry, **options)
+
+
+def _picture(variants):
+    srcsets = {image_format: [] for image_format in FORMATS}
+    for (_, options), thumbnail in zip(THUMBNAIL_SIZES, variants):
+        srcsets[options['format']].append(
+            f'{thumbnail.url} {thumbnail.width}w'
+        )
+    fallback = variants[-1]
+    return {
+        'webp_srcset': ', '.join(srcsets['WEBP']),
+        'jpeg_srcset': ', '.join(srcsets['JPEG']),
+        'src': fallback.url,
+        'width': fallback.width,
+        'height': fallback.height,
+    }
+
+
+def _get_many_raw(keys):
+    """
+    Значения kvstore по ключам: одна выборка из кеша, а промахи —
+    одним запросом к таблице sorl, которая переживает перезапуски.
+    Отсутствующие ключи кешируются так же, как это делает sorl.
+    """
+    kvstore = default.kvstore
+    if not isinstance(kvstore, CachedDBKVStore):
+        return {key: kvstore._get_raw(key) for key in keys}
+    values = kvstore.cache.get_many(keys)
+    missing = [key for key in keys if key not in values]
+    if missing:
+        stored = dict(
+            KVStoreModel.objects.filter(key__in=missing).values_list(
+                'key', 'value'
+            )
+        )
+        found = {key: stored.get(key, EMPTY_VALUE) for key in missing}
+        kvstore.cache.set_many(found, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+        values.update(found)
+    return {
+        key: value for key, value in values.items()
+        if value is not EMPTY_VALUE
+    }
+
+
+def ready_pictures(names):
+    """
+    srcset картинок по именам за одно обращение к kvstore; для
+    картинок, у которых готовы не все варианты, значение None.
+    """
+    names = list(dict.fromkeys(name for name in names if name))
+    keys = {
+        name: [
+            add_prefix(thumbnail_file(name, size, **options).key)
+            for size, options in THUMBNAIL_SIZES
+        ]
+        for name in names
+    }
+    values = _get_many_raw(
+        [key for name_keys in keys.values() for key in name_keys]
+    )
+    pictures = {}
+    for name, name_keys in keys.items():
+        if all(values.get(key) for key in name_keys):
+            pictures[name] = _picture([
+                deserialize_image_file(values[key]) for key in name_keys
+            ])
+        else:
+            pictures[name] = None
+    return pictures
+
+
+def ready_picture(file_):
+    """srcset всех вариантов из kvstore или None, пока готовы не все."""
+    return ready_pictures([file_]).get(file_)
+
+
+def attach_pictures(posts):
+    """Проставляет постам страницы post.picture одной выборкой."""
+    posts = [post for post in posts if post.image]
+    pictures = ready_pictures(post.image.name for post in posts)
+    for post in posts:
+        post.picture = pictures[post.image.name]
+
+
+def build_picture(file_):
+    """Строит недостающие варианты; None, если исходник не открылся."""
+    variants = []
+    for size, options in THUMBNAIL_SIZES:
+        variant = get_thumbnail(file_, size, **options)
+        if variant.size is None:
+            return None
+        variants.append(variant)
+    return _picture(variants)
+
+
+def regenerate(name, force=False):
+    """
+    Строит все варианты картинки; с force сначала удаляет прежние
+    миниатюры и их записи в kvstore. True, если готовы все варианты.
+    """
+    if force:
+        delete(name, delete_file=False)
+    return build_picture(name) is not None
+
+
+def _lock_key(name):
+    return f'thumbnail_lock:{name}'
+
+
+def generate(post_id, name):
+    """
+    Строит все размеры миниатюр и сбрасывает кеши карточки поста.
+    Если картинку построить не удалось, блокировка остаётся до
+    истечения LOCK_TIMEOUT, чтобы страницы не ставили её заново.
+    """
+    try:
+        for size, options in THUMBNAIL_SIZES:
+            get_thumbnail(name, size, **options)
+            if ready_thumbnail(name, size, **options) is None:
+                return
+    except Exception:
+        logger.exception('Не удалось построить миниатюры для %s', name)
+        return
+    Post.objects.filter(pk=post_id).update(updated=timezone.now())
+    feed_cache.touch_post_id(post_id)
+    page_cache.purge(page_cache.post_key(post_id))
+    cache.delete(_lock_key(name))
+
+
+def _generate_in_worker(post_id, name):
+    try:
+        generate(post_id, name)
+    finally:
+        connection.close()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails',
+            )
+    return _executor
+
+
+def queue(post_id, name):
+    """
+    Ставит генерацию миниатюр в пул. Одну картинку одновременно
+    обрабатывает только одна задача.
+    """
+    if not name or not cache.add(_lock_key(name), 1, LOCK_TIMEOUT):
+        return
+    if settings.THUMBNAIL_WORKERS:
+        _get_executor().submit(_generate_in_worker, post_id, name)
+    else:
+        generate(post_id, name)
+
+
+def queue_on_commit(post):
+    if post.image:
+        name = post.image.name
+        transaction.on_commit(lambda: queue(post.pk, name))
+
+
+def release(name):
+    """
+    Удаляет файл картинки и его миниатюры, когда на него больше не
+    ссылается ни один пост: одинаковые загрузки делят один файл.
+    """
+    if not name or Post.objects.filter(image=name).exists():
+        return
+    try:
+        delete(name)
+    except SuspiciousFileOperation:
+        logger.warning('Картинка %s вне MEDIA_ROOT, не удаляю', name)
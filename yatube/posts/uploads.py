@@ -0,0 +1,161 @@
+import base64
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation, ValidationError
+from django.core.files.uploadedfile import InMemoryUploadedFile
+from PIL import Image, ImageOps, ImageSequence, UnidentifiedImageError
+
+SAVE_OPTIONS = {
+    'JPEG': {'quality': 85, 'optimize': True, 'progressive': True},
+    'PNG': {'optimize': True},
+    'WEBP': {'quality': 85},
+}
+# Форматы, которые Pillow читает, но не пишет (XPM, PSD, CUR...),
+# пересохраняются в PNG.
+FALLBACK_FORMAT = 'PNG'
+PNG_MODES = ('1', 'L', 'LA', 'I', 'P', 'RGB', 'RGBA')
+# Анимации в этих форматах пересохраняются кадр за кадром; у прочих
+# многокадровых форматов остаётся первый кадр.
+ANIMATION_FORMATS = ('GIF', 'PNG', 'WEBP')
+DEFAULT_FRAME_DURATION = 100
+
+# Заглушка повторяет обрезку карточки 960x339; JPEG этого размера
+# занимает несколько сотен байт.
+PLACEHOLDER_SIZE = (32, 11)
+PLACEHOLDER_QUALITY = 40
+
+
+def _is_animated(image):
+    return getattr(image, 'is_animated', False)
+
+
+def _save_animation(image, image_format, output):
+    """
+    Пересохраняет все кадры анимации, уменьшенные до IMAGE_MAX_SIDE,
+    без метаданных; длительности кадров и число повторов сохраняются.
+    Суммарно кадры не больше IMAGE_MAX_PIXELS.
+    """
+    max_side = settings.IMAGE_MAX_SIDE
+    frames, durations = [], []
+    pixels = 0
+    for frame in ImageSequence.Iterator(image):
+        # WebP заполняет duration кадра только при декодировании.
+        frame.load()
+        durations.append(frame.info.get('duration', DEFAULT_FRAME_DURATION))
+        frame = frame.convert('RGBA')
+        frame.thumbnail((max_side, max_side), Image.LANCZOS)
+        pixels += frame.width * frame.height
+        if pixels > settings.IMAGE_MAX_PIXELS:
+            raise ValidationError(
+                'Слишком длинная анимация.', code='animation_too_large'
+            )
+        # Комментарии, EXIF и XMP из info попали бы в новый файл.
+        frame.info = {}
+        frames.append(frame)
+    options = dict(SAVE_OPTIONS.get(image_format, {}))
+    if 'loop' in image.info:
+        options['loop'] = image.info['loop']
+    if image_format == 'GIF':
+        # Кадры уже собраны целиком: каждый рисуется на чистом фоне.
+        options['disposal'] = 2
+    frames[0].save(
+        output,
+        image_format,
+        save_all=True,
+        append_images=frames[1:],
+        duration=durations,
+        **options
+    )
+
+
+def normalize_image(upload):
+    """
+    Проверяет размеры картинки по заголовку, до декодирования, затем
+    уменьшает её до IMAGE_MAX_SIDE, поворачивает по EXIF и сохраняет
+    заново без метаданных. Анимации пересохраняются покадрово, у
+    многокадровых снимков телефонов (MPO) остаётся первый кадр в JPEG.
+    Форматы, которые Pillow не умеет записывать, сохраняются в PNG.
+    """
+    upload.seek(0)
+    image = Image.open(upload)
+    width, height = image.size
+    if width * height > settings.IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            'Слишком большое изображение: %(width)s×%(height)s.',
+            code='image_too_large',
+            params={'width': width, 'height': height},
+        )
+    image_format = image.format
+    name, content_type = upload.name, upload.content_type
+    output = BytesIO()
+    if image_format == 'MPO':
+        # Второй кадр — карта глубины или превью; Pillow 8 MPO не пишет.
+        image_format = 'JPEG'
+        name = os.path.splitext(name)[0] + '.jpg'
+        content_type = 'image/jpeg'
+    elif _is_animated(image) and image_format in ANIMATION_FORMATS:
+        _save_animation(image, image_format, output)
+        return _uploaded(output, upload, name, content_type)
+    max_side = settings.IMAGE_MAX_SIDE
+    # JPEG декодируется сразу в уменьшенном масштабе (DCT scaling).
+    image.draft(image.mode, (max_side, max_side))
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((max_side, max_side), Image.LANCZOS)
+    if image_format not in Image.SAVE:
+        image_format = FALLBACK_FORMAT
+        name = os.path.splitext(name)[0] + '.png'
+        content_type = 'image/png'
+        if image.mode not in PNG_MODES:
+            image = image.convert(
+                'RGBA' if 'A' in image.getbands() else 'RGB'
+            )
+    if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    image.save(output, image_format, **SAVE_OPTIONS.get(image_format, {}))
+    return _uploaded(output, upload, name, content_type)
+
+
+def _uploaded(output, upload, name, content_type):
+    size = output.tell()
+    output.seek(0)
+    return InMemoryUploadedFile(
+        output,
+        field_name=getattr(upload, 'field_name', None),
+        name=name,
+        content_type=content_type,
+        size=size,
+        charset=None,
+    )
+
+
+def describe_image(file_):
+    """
+    Исходные размеры картинки и заглушка-data URI для карточки;
+    (None, None, '') для файлов, которые не открываются.
+    """
+    try:
+        file_.seek(0)
+        with Image.open(file_) as image:
+            width, height = image.size
+            image.draft('RGB', PLACEHOLDER_SIZE)
+            preview = ImageOps.fit(
+                ImageOps.exif_transpose(image).convert('RGB'),
+                PLACEHOLDER_SIZE,
+                Image.BILINEAR,
+            )
+    except (
+        OSError,
+        SuspiciousFileOperation,
+        UnidentifiedImageError,
+        ValueError,
+    ):
+        return None, None, ''
+    finally:
+        if not file_.closed:
+            file_.seek(0)
+    output = BytesIO()
+    preview.save(output, 'JPEG', quality=PLACEHOLDER_QUALITY)
+    data = base64.b64encode(output.getvalue()).decode()
+    return width, height, f'data:image/jpeg;base64,{data}'
@@ -1,10 +1,272 @@
-from django.core.paginator import Paginator
+import datetime
+import json
+from math import ceil
+
+from django.core import signing
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.db.models import Max, Min, Q, QuerySet
+from django.utils.dateparse import parse_datetime
 
 NUMBER_OF_ELEMENTS = 10
+COMMENTS_BATCH = 20
+PAGE_WINDOW = 2
+COUNT_CACHE_TIMEOUT = 60
+CURSOR_SALT = 'posts.cursor'
+
+
+class CursorSerializer:
+    def dumps(self, obj):
+        return json.dumps(obj, separators=(',', ':')).encode('latin-1')
+
+    def loads(self, data):
+        return json.loads(data.decode('latin-1'))
+
+
+def _dump_value(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return value
+
+
+def _load_value(value):
+    if isinstance(value, str):
+        return parse_datetime(value) or value
+    return value
+
+
+def encode_cursor(number, reverse, values=None):
+    if values is not None:
+        values = [_dump_value(value) for value in values]
+    return signing.dumps(
+        [number, reverse, values],
+        salt=CURSOR_SALT,
+        serializer=CursorSerializer,
+    )
+
+
+def decode_cursor(cursor):
+    number, reverse, values = signing.loads(
+        cursor, salt=CURSOR_SALT, serializer=CursorSerializer
+    )
+    if values is not None:
+        values = [_load_value(value) for value in values]
+    return int(number), bool(reverse), values
+
+
+def get_ordering(queryset):
+    """Порядок queryset, который завершается уникальным ключом (*pk/id)."""
+    ordering = list(
+        queryset.query.order_by or queryset.model._meta.ordering
+    )
+    last = ordering[-1] if ordering else ''
+    if last.lstrip('-') != 'id' and not last.endswith('pk'):
+        ordering.append('-pk' if last.startswith('-') else 'pk')
+    return ordering
+
+
+def _flip(ordering):
+    return [
+        key[1:] if key.startswith('-') else f'-{key}' for key in ordering
+    ]
+
+
+def seek(queryset, ordering, values=None, reverse=False):
+    """Keyset-выборка: записи строго после values в порядке ordering."""
+    if reverse:
+        ordering = _flip(ordering)
+    queryset = queryset.order_by(*ordering)
+    if values is None:
+        return queryset
+    condition = Q()
+    for index, key in enumerate(ordering):
+        name = key.lstrip('-')
+        lookup = 'lt' if key.startswith('-') else 'gt'
+        step = Q(**{f'{name}__{lookup}': values[index]})
+        for prev_key, prev_value in zip(ordering[:index], values):
+            step &= Q(**{prev_key.lstrip('-'): prev_value})
+        condition |= step
+    return queryset.filter(condition)
+
 
+def cached_count(queryset, key, timeout=COUNT_CACHE_TIMEOUT):
+    return lambda: cache.get_or_set(key, queryset.count, timeout)
 
-def get_paginator(queryet, request):
-    paginator = Paginator(queryet, NUMBER_OF_ELEMENTS)
+
+def estimated_count(model):
+    def estimate():
+        bounds = model.objects.aggregate(low=Min('pk'), high=Max('pk'))
+        if bounds['high'] is None:
+            return 0
+        return bounds['high'] - bounds['low'] + 1
+    return estimate
+
+
+class CursorPaginator(Paginator):
+    """
+    Paginator, который кроме ?page=N понимает ?cursor=<токен>.
+    Страница по курсору выбирается по (pub_date, id) без OFFSET.
+
+    Если передан count (число или функция), точный COUNT(*) не
+    выполняется: страница выбирается с лишней записью, по которой
+    определяется has_next, а count считается оценкой.
+    """
+
+    def __init__(self, object_list, per_page, count=None, **kwargs):
+        if isinstance(object_list, QuerySet):
+            self.ordering = get_ordering(object_list)
+            object_list = object_list.order_by(*self.ordering)
+        else:
+            self.ordering = list(object_list.ordering)
+        super().__init__(object_list, per_page, **kwargs)
+        self.estimate = count
+        self._count = self._num_pages = None
+
+    @property
+    def count(self):
+        if self._count is None:
+            if self.estimate is None:
+                self._count = Paginator.count.func(self)
+            elif callable(self.estimate):
+                self._count = self.estimate()
+            else:
+                self._count = self.estimate
+        return self._count
+
+    @property
+    def num_pages(self):
+        if self._num_pages is None:
+            if self.count == 0 and not self.allow_empty_first_page:
+                self._num_pages = 0
+            else:
+                hits = max(1, self.count - self.orphans)
+                self._num_pages = ceil(hits / self.per_page)
+        return self._num_pages
+
+    def _fit(self, object_list, number, has_more=None):
+        if has_more is None:
+            has_more = len(object_list) > self.per_page
+            object_list = object_list[:self.per_page]
+        if not has_more:
+            self._count = (number - 1) * self.per_page + len(object_list)
+            self._num_pages = number
+        elif self.num_pages <= number:
+            self._count = max(self.count, number * self.per_page + 1)
+            self._num_pages = number + 1
+        return self._get_page(object_list, number, self)
+
+    def page(self, number):
+        if self.estimate is None:
+            return super().page(number)
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('That page number is not an integer')
+        if number < 1:
+            raise EmptyPage('That page number is less than 1')
+        bottom = (number - 1) * self.per_page
+        object_list = list(
+            self.object_list[bottom:bottom + self.per_page + 1]
+        )
+        if not object_list and number > 1:
+            raise EmptyPage('That page contains no results')
+        return self._fit(object_list, number)
+
+    def _seek(self, values, reverse):
+        if isinstance(self.object_list, QuerySet):
+            return seek(self.object_list, self.ordering, values, reverse)
+        return self.object_list.seek(values, reverse)
+
+    def _values(self, obj):
+        return [getattr(obj, key.lstrip('-')) for key in self.ordering]
+
+    def get_page(self, number=None, cursor=None):
+        if cursor:
+            try:
+                return self.cursor_page(*decode_cursor(cursor))
+            except (signing.BadSignature, ValueError, TypeError):
+                pass
+        if self.estimate is None:
+            return self.with_cursors(super().get_page(number))
+        try:
+            page = self.page(number)
+        except PageNotAnInteger:
+            page = self.page(1)
+        except EmptyPage:
+            return self.cursor_page(None, True, None)
+        return self.with_cursors(page)
+
+    def cursor_page(self, number, reverse, values):
+        if values is None:
+            number = self.num_pages
+            size = self.count - (number - 1) * self.per_page
+        elif self.estimate is None or reverse:
+            size = self.per_page
+        else:
+            size = self.per_page + 1
+        object_list = list(self._seek(values, reverse)[:max(size, 0)])
+        if reverse:
+            if values is not None and len(object_list) < self.per_page:
+                return self.with_cursors(self.page(1))
+            object_list.reverse()
+        if self.estimate is None:
+            page = self._get_page(object_list, number, self)
+        elif reverse:
+            page = self._fit(object_list, number, has_more=values is not None)
+        else:
+            page = self._fit(object_list, number)
+        return self.with_cursors(page)
+
+    def with_cursors(self, page):
+        page.object_list = list(page.object_list)
+        page.window = range(
+            max(1, page.number - PAGE_WINDOW),
+            min(self.num_pages, page.number + PAGE_WINDOW) + 1
+        )
+        page.next_cursor = page.previous_cursor = None
+        page.last_cursor = encode_cursor(self.num_pages, True)
+        if not page.object_list:
+            return page
+        if page.has_next():
+            page.next_cursor = encode_cursor(
+                page.number + 1, False, self._values(page.object_list[-1])
+            )
+        if page.has_previous():
+            page.previous_cursor = encode_cursor(
+                page.number - 1, True, self._values(page.object_list[0])
+            )
+        return page
+
+
+def get_paginator(queryet, request, count=None):
+    paginator = CursorPaginator(queryet, NUMBER_OF_ELEMENTS, count=count)
     page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    cursor = request.GET.get('cursor')
+    page_obj = paginator.get_page(page_number, cursor)
     return page_obj
+
+
+def get_comments(post, cursor=None, size=COMMENTS_BATCH):
+    """Очередная порция комментариев поста по курсору (created, id)."""
+    ordering = ['created', 'id']
+    values = None
+    if cursor:
+        try:
+            _, _, values = decode_cursor(cursor)
+        except (signing.BadSignature, ValueError, TypeError):
+            values = None
+    comments = list(
+        seek(
+            post.comments.select_related('author').only(
+                'text', 'created', 'post', 'author__username'
+            ),
+            ordering,
+            values
+        )[:size + 1]
+    )
+    next_cursor = None
+    if len(comments) > size:
+        comments = comments[:size]
+        last = comments[-1]
+        next_cursor = encode_cursor(0, False, [last.created, last.pk])
+    return comments, next_cursor
@@ -0,0 +1,86 @@
+import datetime
+import hashlib
+
+from django.db.models import Max
+from django.views.decorators.http import condition
+
+from posts.cache import feed_version, fragment_key
+from posts.models import Group, Post, User
+
+
+def _etag(request, *parts):
+    parts = (request.user.pk,) + parts
+    raw = '|'.join(str(part) for part in parts).encode()
+    return hashlib.md5(raw).hexdigest()
+
+
+def _from_version(*versions):
+    return datetime.datetime.fromtimestamp(
+        max(versions) / 1000, tz=datetime.timezone.utc
+    )
+
+
+def _feed(request, *feeds, extra=()):
+    return (
+        _etag(request, fragment_key(request, *feeds), *extra),
+        _from_version(*(feed_version(*feed) for feed in feeds)),
+    )
+
+
+def index_validators(request):
+    return _feed(request, ('index',))
+
+
+def group_validators(request, slug):
+    group = Group.objects.filter(slug=slug).values_list(
+        'pk', 'title', 'description'
+    ).first()
+    if group is None:
+        return None, None
+    return _feed(request, ('group', group[0]), extra=group[1:])
+
+
+def profile_validators(request, username):
+    author = User.objects.filter(username=username).values_list(
+        'pk',
+        'first_name',
+        'last_name',
+        'stats__posts_count',
+        'stats__followers_count',
+        'stats__following_count',
+    ).first()
+    if author is None:
+        return None, None
+    return _feed(request, ('author', author[0]), extra=author[1:])
+
+
+def post_validators(request, post_id):
+    post = Post.objects.filter(pk=post_id).order_by().annotate(
+        last_comment=Max('comments__created')
+    ).values_list(
+        'updated',
+        'last_comment',
+        'comments_count',
+        'author__stats__posts_count',
+    ).first()
+    if post is None:
+        return None, None
+    updated, last_comment, *counts = post
+    last_modified = max(filter(None, (updated, last_comment)))
+    return _etag(request, last_modified.isoformat(), *counts), last_modified
+
+
+def conditional(validators):
+    """
+    condition() c ETag и Last-Modified из одной функции validators,
+    которая вызывается один раз на запрос.
+    """
+    def get(request, *args, **kwargs):
+        if not hasattr(request, '_validators'):
+            request._validators = validators(request, *args, **kwargs)
+        return request._validators
+
+    return condition(
+        etag_func=lambda *args, **kwargs: get(*args, **kwargs)[0],
+        last_modified_func=lambda *args, **kwargs: get(*args, **kwargs)[1],
+    )
@@ -1,38 +1,95 @@
 from django.shortcuts import render, get_object_or_404, redirect
+from django.core.exceptions import PermissionDenied
+from django.http import (
+    FileResponse, Http404, JsonResponse, StreamingHttpResponse
+)
+from django.views.decorators.cache import cache_control
+from django.core.paginator import Paginator
 from django.contrib.auth.decorators import login_required
+from django.db import transaction
 
-from posts.utils import get_paginator
+from PIL import UnidentifiedImageError
+
+from posts import export, resize
+from posts.autocomplete import suggest
+from posts.cache import FEED_CACHE_TIMEOUT, follow_feeds, fragment_key
+from posts.counters import get_stats
+from posts.feeds import follow_feed, followed_celebrities, get_feed_page
+from posts.page_cache import (
+    anonymous_page, author_key, group_key, post_key, surrogate_keys
+)
+from posts.search import SearchResults
+from posts.thumbnails import queue_on_commit
+from posts.utils import (
+    NUMBER_OF_ELEMENTS, cached_count, estimated_count, get_comments
+)
+from posts.validators import (
+    conditional,
+    group_validators,
+    index_validators,
+    post_validators,
+    profile_validators,
+)
 from posts.models import Post, Group, User, Follow
 from posts.forms import PostForm, CommentForm
 
 TITLE_LENGHT = 30
+# Варианты картинок неизменны: имя файла — хеш содержимого.
+RESIZE_MAX_AGE = 60 * 60 * 24 * 365
+
+
+def page_keys(page_obj):
+    return [post_key(post.pk) for post in page_obj]
 
 
+@anonymous_page
+@conditional(index_validators)
 def index(request):
     post_list = Post.objects.all()
-    page_obj = get_paginator(post_list, request)
-    context = {'page_obj': page_obj}
-    return render(request, 'posts/index.html', context)
+    page_obj = get_feed_page(
+        post_list, request, count=estimated_count(Post)
+    )
+    context = {
+        'page_obj': page_obj,
+        'cache_timeout': FEED_CACHE_TIMEOUT,
+        'cache_key': fragment_key(request, ('index',)),
+    }
+    return surrogate_keys(
+        render(request, 'posts/index.html', context),
+        'index', *page_keys(page_obj)
+    )
 
 
+@anonymous_page
+@conditional(group_validators)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
     posts = group.posts.all()
-    page_obj = get_paginator(posts, request)
+    page_obj = get_feed_page(
+        posts, request, count=cached_count(posts, f'group_posts:{group.pk}')
+    )
     context = {
         'group': group,
         'title': group,
         'page_obj': page_obj,
+        'cache_timeout': FEED_CACHE_TIMEOUT,
+        'cache_key': fragment_key(request, ('group', group.pk)),
     }
-    return render(request, 'posts/group_list.html', context)
+    return surrogate_keys(
+        render(request, 'posts/group_list.html', context),
+        group_key(group.slug), *page_keys(page_obj)
+    )
 
 
+@anonymous_page
+@conditional(profile_validators)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
+    stats = get_stats(author)
     posts = Post.objects.filter(author=author)
-    page_obj = get_paginator(posts, request)
-    subscriptions_count = Follow.objects.filter(user=author).count()
-    subscribers_count = Follow.objects.filter(author=author).count()
+    page_obj = get_feed_page(posts, request, count=stats.posts_count)
     following = (
         request.user.is_authenticated
         and Follow.objects.filter(
@@ -44,26 +101,57 @@ def profile(request, username):
         'following': following,
         'author': author,
         'page_obj': page_obj,
-        'subscriptions_count': subscriptions_count,
-        'subscribers_count': subscribers_count,
+        'posts_count': stats.posts_count,
+        'subscriptions_count': stats.following_count,
+        'subscribers_count': stats.followers_count,
+        'cache_timeout': FEED_CACHE_TIMEOUT,
+        'cache_key': fragment_key(request, ('author', author.pk)),
     }
-    return render(request, 'posts/profile.html', context)
+    return surrogate_keys(
+        render(request, 'posts/profile.html', context),
+        author_key(author.pk), *page_keys(page_obj)
+    )
 
 
+@anonymous_page
+@conditional(post_validators)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), id=post_id
+    )
     form = CommentForm(request.POST or None)
-    comments = post.comments.all()
-    author_post = Post.objects.filter(author=post.author)
+    comments, next_cursor = get_comments(post)
     title = post.text[:TITLE_LENGHT]
     context = {
         'post': post,
-        'author_post': author_post,
+        'author_posts_count': get_stats(post.author).posts_count,
         'title': title,
         'form': form,
         'comments': comments,
+        'next_cursor': next_cursor,
+    }
+    response = surrogate_keys(
+        render(request, 'posts/post_detail.html', context),
+        post_key(post.pk), author_key(post.author_id)
+    )
+    if post.group:
+        surrogate_keys(response, group_key(post.group.slug))
+    return response
+
+
+@anonymous_page
+def post_comments(request, post_id):
+    post = get_object_or_404(Post.objects.only('pk'), id=post_id)
+    comments, next_cursor = get_comments(post, request.GET.get('cursor'))
+    context = {
+        'post': post,
+        'comments': comments,
+        'next_cursor': next_cursor,
     }
-    return render(request, 'posts/post_detail.html', context)
+    return surrogate_keys(
+        render(request, 'includes/comments.html', context),
+        post_key(post.pk)
+    )
 
 
 @login_required(redirect_field_name=None)
@@ -73,7 +161,9 @@ def post_create(request):
     if form.is_valid():
         form = form.save(commit=False)
         form.author = request.user
-        form.save()
+        with transaction.atomic():
+            form.save()
+            queue_on_commit(form)
         return redirect('posts:profile', request.user)
 
     return render(request, 'posts/create_post.html', {'form': form})
@@ -92,7 +182,10 @@ def post_edit(request, post_id):
     )
 
     if form.is_valid():
-        form.save()
+        with transaction.atomic():
+            form.save()
+            if 'image' in form.changed_data:
+                queue_on_commit(post)
         return redirect('posts:post_detail', post.pk)
 
     return render(
@@ -113,15 +206,80 @@ def add_comment(request, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        with transaction.atomic():
+            comment.save()
     return redirect('posts:post_detail', post_id=post_id)
 
 
+def search(request):
+    query = request.GET.get('q', '').strip()
+    paginator = Paginator(SearchResults(query), NUMBER_OF_ELEMENTS)
+    context = {
+        'query': query,
+        'page_obj': paginator.get_page(request.GET.get('page')),
+    }
+    return render(request, 'posts/search.html', context)
+
+
+def autocomplete(request):
+    return JsonResponse({'results': suggest(request.GET.get('q', ''))})
+
+
+@cache_control(public=True, max_age=RESIZE_MAX_AGE, immutable=True)
+def resize_image(request, signature, width, height, path):
+    if not resize.is_valid(signature, path, width, height):
+        raise PermissionDenied
+    resized = resize.open_cached(path, width, height)
+    if resized is not None:
+        return FileResponse(resized, content_type=resize.content_type(path))
+    if not resize.is_allowed(path, width, height):
+        raise Http404
+    try:
+        resized = resize.open_resized(path, width, height)
+    except (FileNotFoundError, UnidentifiedImageError):
+        raise Http404
+    return FileResponse(resized, content_type=resize.content_type(path))
+
+
+@login_required(redirect_field_name=None)
+def export_jsonl(request):
+    response = StreamingHttpResponse(
+        export.jsonl_stream(request.user),
+        content_type='application/x-ndjson; charset=utf-8',
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="{request.user.username}.jsonl"'
+    )
+    return response
+
+
+@login_required(redirect_field_name=None)
+def export_zip(request):
+    storage = Post._meta.get_field('image').storage
+    response = StreamingHttpResponse(
+        export.zip_stream(request.user, storage),
+        content_type='application/zip',
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="{request.user.username}.zip"'
+    )
+    return response
+
+
 @login_required(redirect_field_name=None)
 def follow_index(request):
-    post_list = Post.objects.filter(author__following__user=request.user)
-    page_obj = get_paginator(post_list, request)
-    context = {'page_obj': page_obj}
+    celebrities = followed_celebrities(request.user)
+    post_list = follow_feed(request.user, celebrities)
+    page_obj = get_feed_page(
+        post_list,
+        request,
+        count=cached_count(post_list, f'follow_posts:{request.user.pk}')
+    )
+    context = {
+        'page_obj': page_obj,
+        'cache_timeout': FEED_CACHE_TIMEOUT,
+        'cache_key': fragment_key(request, *follow_feeds(request.user)),
+    }
     return render(request, 'posts/follow.html', context)
 
 
@@ -129,10 +287,11 @@ def follow_index(request):
 def profile_follow(request, username):
     if request.user != get_object_or_404(User, username=username):
         author = User.objects.get(username=username)
-        Follow.objects.get_or_create(
-            user=request.user,
-            author=author
-        )
+        with transaction.atomic():
+            Follow.objects.get_or_create(
+                user=request.user,
+                author=author
+            )
     return redirect('posts:profile', username=username)
 
 
@@ -140,5 +299,6 @@ def profile_follow(request, username):
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     if Follow.objects.filter(user=request.user, author=author).exists():
-        Follow.objects.filter(user=request.user, author=author).delete()
+        with transaction.atomic():
+            Follow.objects.filter(user=request.user, author=author).delete()
     return redirect('posts:profile', username=username)
@@ -126,3 +126,35 @@ CACHES = {
 INTERNAL_IPS = [
     '127.0.0.1',
 ]
+
+# Адрес, на который уходят запросы PURGE с ключами Surrogate-Key
+# изменившихся страниц. Без него прокси не кеширует анонимные страницы.
+PAGE_CACHE_PURGE_URL = None
+
+FEED_FANOUT_THRESHOLD = 10000
+# Автор возвращается к рассылке постов, когда подписчиков становится
+# меньше этого числа.
+FEED_FANOUT_RESUME = 9000
+# Ленты подписчиков автора, вернувшегося к рассылке, дополняются
+# в фоновом потоке; False — сразу после коммита в том же запросе.
+FEED_FILL_IN_BACKGROUND = not DEBUG
+
+# Метаданные миниатюр хранятся в таблице sorl и кешируются: после
+# перезапуска лента достаёт их одним запросом, не проверяя файлы.
+THUMBNAIL_KVSTORE = 'sorl.thumbnail.kvstores.cached_db_kvstore.KVStore'
+
+# Потоки для фоновой генерации миниатюр; 0 — строить сразу после
+# коммита в том же запросе (удобно при разработке и в тестах).
+THUMBNAIL_WORKERS = 0 if DEBUG else 2
+
+# Загруженные картинки уменьшаются до этой стороны, а картинки больше
+# IMAGE_MAX_PIXELS отклоняются ещё до декодирования.
+IMAGE_MAX_SIDE = 2048
+IMAGE_MAX_PIXELS = 100_000_000
+
+# Дисковый кеш вариантов картинок, уменьшенных по запросу
+# /media/resize/...; давно не запрошенные варианты вытесняются.
+# В продакшене этот префикс проксируется в Django, а не отдаётся
+# веб-сервером из MEDIA_ROOT.
+RESIZE_CACHE_ROOT = os.path.join(BASE_DIR, 'resize_cache')
+RESIZE_CACHE_MAX_BYTES = 512 * 1024 * 1024
@@ -5,3 +5,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
 
 application = get_wsgi_application()
+
+# Индексы похожих текстов строятся при старте процесса, а не в первом
+# запросе, который сохраняет пост или комментарий.
+from posts import text_duplicates  # noqa: E402
+
+text_duplicates.warm()